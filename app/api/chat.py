@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Body, HTTPException
+from fastapi import APIRouter, Body, HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 import sqlite3
+import threading
 import datetime
 from pathlib import Path
-from app.models.chat_models import ChatRequest, ChatResponse
+from app.models.chat_models import ChatRequest, ChatResponse, PrefetchRequest, PrefetchResponse
 from app.services.llm.main_llm import MainLLM
+from app.services.llm.llm_policy import LLMDeadlineExceeded
+from app.services.rate_limit import UpstreamBusyError, chat_admission
+from app.services.http_cache import cached_response
+from app.services.prefetch_service import PrefetchService
 from typing import List, Dict
 
 # Create router
@@ -17,6 +24,7 @@ DB_FILE = DB_DIR / "myai.db"
 DB_DIR.mkdir(exist_ok=True)
 
 main_llm = None
+main_llm_lock = threading.Lock()
 
 def load_chat_history():
     """Load chat history from SQLite database - last 20 messages"""
@@ -26,6 +34,31 @@ def load_chat_history():
         print("Loaded chat history from database")
         return [{"role": row[0], "parts": row[1]} for row in reversed(cursor.fetchall())]
     
+def load_chat_history_blocks(block_size: int):
+    """
+    Split recent chat history at a block boundary for context caching
+    
+    Messages after the last multiple of block_size (by id) are returned verbatim;
+    the block before that boundary only changes once per block_size messages, so
+    it can be summarized and cached as a stable prefix.
+    
+    Returns:
+        (older block, recent messages)
+    """
+    with sqlite3.connect(DB_FILE) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chat")
+        last_id = cursor.fetchone()[0]
+        boundary = last_id - last_id % block_size
+        cursor.execute(
+            "SELECT id, role, parts FROM chat WHERE id > ? ORDER BY id",
+            (boundary - block_size,)
+        )
+        rows = cursor.fetchall()
+    older = [{"role": role, "parts": parts} for row_id, role, parts in rows if row_id <= boundary]
+    recent = [{"role": role, "parts": parts} for row_id, role, parts in rows if row_id > boundary]
+    return older, recent
+    
 def save_chat_message(role: str, message: str):
     """Save chat message to SQLite database"""
     timestamp = datetime.datetime.now().isoformat()
@@ -37,23 +70,51 @@ def save_chat_message(role: str, message: str):
         )
         conn.commit()
     print("Saved message to database:", message)
+
+def get_main_llm() -> MainLLM:
+    """
+    Initialize MainLLM only once per process (singleton pattern)
+    
+    The singleton only holds stateless clients (model, memory, web agent);
+    conversation history is rebuilt from SQLite on every request so that
+    several worker processes never diverge.
+    """
+    global main_llm
+    with main_llm_lock:
+        if main_llm is None:
+            main_llm = MainLLM()
+        return main_llm
     
+prefetch_service = PrefetchService(get_main_llm)
+
 @chat_router.post("/chat", response_model=ChatResponse)
 async def create_chat(request: ChatRequest = Body(...)):
     """Process chat request and generate response"""
     try:
-        global main_llm
-        
-        # Initialize MainLLM only once with chat history (singleton pattern)
-        if main_llm is None:
-            history = load_chat_history()
-            main_llm = MainLLM(history=history)
-        
-        # Use MainLLM for all responses (it already handles web search internally)
-        response_text = main_llm.process_chat(
-            request.message, 
-            with_search=request.web_search_enabled
-        )
+        # Bounded queue: shed load with 503 instead of piling up behind upstream quotas
+        async with chat_admission.admit():
+            llm = await run_in_threadpool(get_main_llm)
+            if llm.context_cache is not None:
+                older_history, history = await run_in_threadpool(load_chat_history_blocks, llm.context_cache_block)
+            else:
+                older_history, history = None, await run_in_threadpool(load_chat_history)
+            prefetched = await run_in_threadpool(
+                prefetch_service.take,
+                request.client_id,
+                request.message,
+                request.web_search_enabled
+            )
+            
+            # Use MainLLM for all responses (it already handles web search internally)
+            # Run in the threadpool so concurrent requests can overlap (and coalesce) their search work
+            response_text = await run_in_threadpool(
+                llm.process_chat,
+                request.message, 
+                with_search=request.web_search_enabled,
+                history=history,
+                prefetched=prefetched,
+                older_history=older_history
+            )
         
         # Save both user message and AI response to storage
         save_chat_message("user", request.message)
@@ -65,29 +126,58 @@ async def create_chat(request: ChatRequest = Body(...)):
         
         return ChatResponse(response=response_text, used_web_search=used_web_search)
     
+    except UpstreamBusyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Service busy: {str(e)}",
+            headers={"Retry-After": e.retry_after_header}
+        )
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=f"Chat processing timed out: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat processing error: {str(e)}")
 
+@chat_router.post("/prefetch", response_model=PrefetchResponse, status_code=202)
+async def create_prefetch(request: PrefetchRequest = Body(...)):
+    """Speculatively warm search and memory results for a draft message"""
+    status = prefetch_service.schedule(request.client_id, request.draft, request.web_search_enabled)
+    return PrefetchResponse(status=status)
+
+@chat_router.delete("/prefetch/{client_id}", response_model=PrefetchResponse)
+async def cancel_prefetch(client_id: str):
+    """Cancel a client's pending prefetch (e.g. when the draft is cleared)"""
+    prefetch_service.cancel(client_id)
+    return PrefetchResponse(status="cancelled")
+
 @chat_router.get("/chat/history")
-async def get_chat_history():
+async def get_chat_history(request: Request):
     """Get chat history from database for display in UI"""
     try:
         with sqlite3.connect(DB_FILE) as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT id, timestamp, role, parts FROM chat ORDER BY id")
-            rows = cursor.fetchall()
             
-            # Format the chat history as a list of messages
-            messages = []
-            for row in rows:
-                messages.append({
-                    "id": row[0],
-                    "timestamp": row[1],
-                    "role": row[2],
-                    "content": row[3]
-                })
+            # The chat log is append-only, so row count and last id identify its contents
+            cursor.execute("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM chat")
+            count, last_id = cursor.fetchone()
+            etag = f'"history-{count}-{last_id}"'
+            
+            def build_response():
+                cursor.execute("SELECT id, timestamp, role, parts FROM chat ORDER BY id")
+                rows = cursor.fetchall()
+                
+                # Format the chat history as a list of messages
+                messages = []
+                for row in rows:
+                    messages.append({
+                        "id": row[0],
+                        "timestamp": row[1],
+                        "role": row[2],
+                        "content": row[3]
+                    })
+                
+                return JSONResponse({"messages": messages})
             
-            return {"messages": messages}
+            return cached_response(request, etag, build_response)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching chat history: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from app.services.single_flight import single_flight_stats
+from app.services.rate_limit import rate_limit_stats
+from app.api import chat
+
+# Create router
+metrics_router = APIRouter(prefix="/api", tags=["metrics"])
+
+@metrics_router.get("/metrics")
+async def get_metrics():
+    """Expose in-process performance counters"""
+    context_cache = chat.main_llm.context_cache if chat.main_llm is not None else None
+    return {
+        "single_flight": single_flight_stats(),
+        "rate_limit": rate_limit_stats(),
+        "prefetch": chat.prefetch_service.stats(),
+        "context_cache": context_cache.stats() if context_cache is not None else None
+    }
@@ -1,13 +1,21 @@
 import os
 import sqlite3
 from pathlib import Path
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 
 # Import routers
+from app.api import chat as chat_api
 from app.api.chat import chat_router
+from app.api.metrics import metrics_router
+from app.services.http_cache import CachedStaticFiles, cached_response, render_index
+
+try:
+    # Brotli when the optional brotli-asgi package is installed; it falls back to gzip per client
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
 
 # Load environment variables
 load_dotenv()
@@ -15,6 +23,12 @@ load_dotenv()
 # Create app
 app = FastAPI(title="Personal AI Assistant")
 
+# Compress responses (HTML, JS/CSS, history JSON) above 500 bytes
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=500)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=500)
+
 # Initialize database
 DB_DIR = Path("./data")
 DB_FILE = DB_DIR / "myai.db"
@@ -23,6 +37,8 @@ DB_DIR.mkdir(exist_ok=True)
 def init_db():
     """Initialize SQLite database with required tables"""
     with sqlite3.connect(DB_FILE) as conn:
+        # WAL lets several worker processes read while one writes
+        conn.execute("PRAGMA journal_mode=WAL")
         cursor = conn.cursor()
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS chat (
@@ -38,16 +54,27 @@ def init_db():
 # Initialize database
 init_db()
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Mount static files (content-hashed URLs are cached as immutable)
+app.mount("/static", CachedStaticFiles(directory="static"), name="static")
+
+# Delete the Gemini context cache on shutdown so it stops accruing storage cost
+@app.on_event("shutdown")
+def close_context_cache():
+    llm = chat_api.main_llm
+    if llm is not None and llm.context_cache is not None:
+        llm.context_cache.close()
 
 # Include routers
 app.include_router(chat_router)
+app.include_router(metrics_router)
+
+# Render the frontend once with content-hashed asset URLs
+INDEX_HTML, INDEX_ETAG = render_index("templates/index.html", "static")
 
 # Root route to serve the frontend
 @app.get("/")
-async def read_root():
-    return FileResponse("templates/index.html")
+async def read_root(request: Request):
+    return cached_response(request, INDEX_ETAG, lambda: Response(INDEX_HTML, media_type="text/html"))
 
 # Run with: uvicorn run:app --reload
 if __name__ == "__main__":
@@ -1,11 +1,23 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class ChatRequest(BaseModel):
     """Model for chat request from user"""
     message: str
     web_search_enabled: bool = True  # Toggle for web search feature
+    client_id: Optional[str] = None  # Lets the server reuse this client's speculative prefetch
 
 class ChatResponse(BaseModel):
     """Model for chat response to user"""
     response: str
-    used_web_search: bool = False  # Indicates if web search was used
\ No newline at end of file
+    used_web_search: bool = False  # Indicates if web search was used
+
+class PrefetchRequest(BaseModel):
+    """Model for a speculative prefetch of a draft message"""
+    client_id: str
+    draft: str
+    web_search_enabled: bool = True
+
+class PrefetchResponse(BaseModel):
+    """Model for prefetch scheduling outcome"""
+    status: str  # scheduled, duplicate, too_short, throttled or cancelled
\ No newline at end of file
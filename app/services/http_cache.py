@@ -0,0 +1,87 @@
+import hashlib
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Tuple
+from urllib.parse import parse_qs
+from fastapi import Request, Response
+from fastapi.staticfiles import StaticFiles
+
+# Content-hashed assets never change under the same URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Always revalidate, but allow a 304 via ETag
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+STATIC_URL_PATTERN = re.compile(r'(href|src)="/static/([^"?#]+)"')
+
+
+@lru_cache(maxsize=256)
+def _hash_file(path: str, mtime_ns: int, size: int) -> str:
+    """Hash file contents; keyed by mtime/size so edits produce a new hash"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def asset_hash(path: Path) -> str:
+    """Return a short content hash for a static file"""
+    stat = path.stat()
+    return _hash_file(str(path), stat.st_mtime_ns, stat.st_size)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Check If-None-Match against an ETag, ignoring weak prefixes"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in candidates
+
+
+def cached_response(request: Request, etag: str, build) -> Response:
+    """Return 304 if the client already has this ETag, otherwise build() the response and tag it"""
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response = build()
+    response.headers.update(headers)
+    return response
+
+
+def render_index(template_path: str, static_dir: str) -> Tuple[bytes, str]:
+    """
+    Rewrite /static/... references in an HTML page to content-hashed URLs
+
+    Returns:
+        The rendered page and its strong ETag
+    """
+    html = Path(template_path).read_text(encoding="utf-8")
+
+    def add_version(match: re.Match) -> str:
+        asset = Path(static_dir) / match.group(2)
+        if not asset.is_file():
+            return match.group(0)
+        return f'{match.group(1)}="/static/{match.group(2)}?v={asset_hash(asset)}"'
+
+    body = STATIC_URL_PATTERN.sub(add_version, html).encode("utf-8")
+    etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+    return body, etag
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that serves content-hashed URLs (?v=<hash>) as immutable"""
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await super().get_response(path, scope)
+        if response.status_code not in (200, 304):
+            return response
+
+        version = parse_qs(scope.get("query_string", b"").decode()).get("v", [None])[0]
+        full_path, _ = self.lookup_path(path)
+        if version and full_path and version == asset_hash(Path(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        else:
+            # Unversioned or stale version: let the browser revalidate with the ETag StaticFiles already sends
+            response.headers["Cache-Control"] = REVALIDATE_CACHE_CONTROL
+        return response
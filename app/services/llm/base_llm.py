@@ -1,16 +1,41 @@
 import os
+import time
+import logging
+import threading
 import google.generativeai as genai
-from typing import List, Dict, Any, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
+from app.services.rate_limit import UpstreamBusyError, gemini_limiter
+from app.services.llm.llm_policy import LLMDeadlineExceeded, LLMPolicy
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Runs primary and hedged/fallback generations so the caller can race them against a deadline
+_attempt_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LLM_ATTEMPT_THREADS", "32")), thread_name_prefix="llm-attempt")
+
+@lru_cache(maxsize=None)
+def load_system_prompt() -> str:
+    """Read the main system prompt from disk once per process"""
+    sysprompt_path = os.path.join(os.path.dirname(__file__), "private_system_prompt.txt")
+    with open(sysprompt_path, "r", encoding="utf-8") as f:
+        return f.read()
+
 class BaseLLM:
     """Base class for LLM services"""
     
-    def __init__(self, model_name: str = "gemini-2.0-flash", is_main: bool = True, history: Optional[List[Dict]] = None):
-        """Initialize the LLM with a specific model"""
+    def __init__(self, model_name: str = "gemini-2.0-flash", is_main: bool = True, policy: Optional[LLMPolicy] = None):
+        """Initialize the LLM with a specific model, or with the models, deadline and hedging of a policy"""
+        if policy is None:
+            policy = LLMPolicy(role="main" if is_main else "web_agent", model_name=model_name)
+        self.policy = policy
+        model_name = policy.model_name
         self.model_name = model_name
         self.api_key = os.getenv("GEMINI_API_KEY")
         
@@ -19,9 +44,7 @@ class BaseLLM:
             
         # Initialize model
         if is_main:
-            sysprompt_path = os.path.join(os.path.dirname(__file__), "private_system_prompt.txt")
-            with open(sysprompt_path, "r", encoding="utf-8") as f:
-                system_instruction = f.read()
+            system_instruction = load_system_prompt()
             
             config = {
                 "max_output_tokens": 512,
@@ -29,7 +52,7 @@ class BaseLLM:
                 "top_p": 0.95,
                 "top_k": 40
             }
-            self.model = genai.GenerativeModel(model_name, generation_config=config, system_instruction=system_instruction)
+            model_kwargs = {"generation_config": config, "system_instruction": system_instruction}
         else:
             system_instruction = """
             Bạn là một AI hỗ trợ tìm kiếm thông tin trên web. 
@@ -43,38 +66,155 @@ class BaseLLM:
                 "max_output_tokens": 512,
                 "temperature": 0.1
             }
-            self.model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+            model_kwargs = {"system_instruction": system_instruction}
+        self.system_instruction = system_instruction
+        self.generation_config = model_kwargs.get("generation_config")
+        self.model = genai.GenerativeModel(model_name, **model_kwargs)
+        self.fallback_model = None
+        if policy.fallback_model_name and policy.fallback_model_name != model_name:
+            self.fallback_model = genai.GenerativeModel(policy.fallback_model_name, **model_kwargs)
         self.is_main = is_main
         
-        if is_main: 
-            if history is None:
-                history = []
-            self.chat = self.model.start_chat(history=history)
-
+    def new_chat(self, history: Optional[List[Dict]] = None):
+        """Start a fresh chat session seeded with the given history"""
+        return self.model.start_chat(history=history or [])
         
-    def generate_response(self, prompt: str) -> str:
+    def generate_response(self, prompt: str, chat=None, history_prefix: Optional[List] = None) -> str:
         if self.is_main:
-            # Generate response using the chat model
+            # Generate response using a per-request chat session, nothing shared with other requests
             try:
-                response = self.chat.send_message(prompt)
-                return response.text
+                return self._generate(prompt, chat if chat is not None else self.new_chat(), history_prefix)
+            except (UpstreamBusyError, LLMDeadlineExceeded):
+                raise
             except Exception as e:
                 print(f"Error generating response: {str(e)}")
                 return f"I'm having trouble generating a response at the moment. Error: {str(e)}"
         else:
             # Generate response using the non-chat model
             try:
-                # Using generate_content instead of generate
-                response = self.model.generate_content(prompt)
-                # Access text property correctly based on the API
-                if hasattr(response, 'text'):
-                    return response.text
-                elif hasattr(response, 'parts'):
-                    return ''.join(part.text for part in response.parts)
-                else:
-                    # Handle case where response structure is different
-                    print("Response structure is unexpected:", type(response))
-                    return str(response)
+                return self._generate(prompt)
+            except (UpstreamBusyError, LLMDeadlineExceeded):
+                raise
             except Exception as e:
                 print(f"Error generating response: {str(e)}")
-                return f"I'm having trouble generating a response at the moment. Error: {str(e)}"
\ No newline at end of file
+                return f"I'm having trouble generating a response at the moment. Error: {str(e)}"
+
+    def _generate(self, prompt: str, chat=None, history_prefix: Optional[List] = None) -> str:
+        """
+        Generate a response under this LLM's policy
+        
+        The primary model streams its answer. If it fails, or has not produced its
+        first token within hedge_after_ms, the fallback model is started on a copy
+        of the same chat history and whichever completes first wins; the other is
+        cancelled. On success the winning turn is written back to chat.
+        
+        The primary runs on chat's own model, which may be bound to a context
+        cache; history_prefix holds the cached contents the fallback must be sent
+        explicitly.
+        
+        Raises:
+            LLMDeadlineExceeded: if no attempt completed within deadline_ms
+        """
+        policy = self.policy
+        history = list(chat.history) if chat is not None else None
+        fallback_history = list(history_prefix or []) + history if history is not None else None
+        primary_model = chat.model if chat is not None else self.model
+        start = time.monotonic()
+        deadline = start + policy.deadline_ms / 1000 if policy.deadline_ms else None
+        hedge_at = start + policy.hedge_after_ms / 1000 if policy.hedge_after_ms and self.fallback_model else None
+        
+        attempts = {}
+        
+        def launch(label: str, model, model_name: str, attempt_history: Optional[List]) -> threading.Event:
+            first_token = threading.Event()
+            cancel = threading.Event()
+            future = _attempt_executor.submit(self._stream_attempt, model, prompt, attempt_history, deadline, first_token, cancel)
+            attempts[future] = (label, model_name, cancel)
+            return first_token
+        
+        primary_first_token = launch("primary", primary_model, policy.model_name, history)
+        fallback_launched = False
+        last_error: Optional[BaseException] = None
+        
+        try:
+            while attempts:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise LLMDeadlineExceeded(policy.role, policy.deadline_ms)
+                
+                wake_times = [t - now for t in (deadline, hedge_at) if t is not None]
+                timeout = max(0.0, min(wake_times)) if wake_times else None
+                done, _ = wait(list(attempts), timeout=timeout, return_when=FIRST_COMPLETED)
+                
+                # Hedge: the primary has been silent for too long
+                if (hedge_at is not None and not fallback_launched and time.monotonic() >= hedge_at
+                        and not primary_first_token.is_set()):
+                    logger.info(f"[{policy.role}] No first token from {policy.model_name} after {policy.hedge_after_ms} ms, hedging with {policy.fallback_model_name}")
+                    launch("hedge", self.fallback_model, policy.fallback_model_name, fallback_history)
+                    fallback_launched = True
+                hedge_at = None if fallback_launched or primary_first_token.is_set() else hedge_at
+                
+                for future in done:
+                    label, model_name, _ = attempts.pop(future)
+                    try:
+                        text, session = future.result()
+                    except Exception as e:
+                        last_error = e
+                        logger.warning(f"[{policy.role}] {label} attempt on {model_name} failed: {str(e)}")
+                        if self.fallback_model is not None and not fallback_launched:
+                            logger.info(f"[{policy.role}] Falling back to {policy.fallback_model_name}")
+                            launch("fallback", self.fallback_model, policy.fallback_model_name, fallback_history)
+                            fallback_launched = True
+                        continue
+                    
+                    elapsed_ms = (time.monotonic() - start) * 1000
+                    logger.info(f"[{policy.role}] Answered by {model_name} ({label}) in {elapsed_ms:.0f} ms")
+                    if chat is not None:
+                        turns = list(session.history)
+                        if label != "primary":
+                            # A fallback session also carried the uncached prefix; chat keeps only its own turns
+                            turns = turns[len(history_prefix or []):]
+                        chat.history = turns
+                    return text
+            raise last_error
+        finally:
+            # Cancel whatever is still running; it stops at its next streamed chunk
+            for _, _, cancel in attempts.values():
+                cancel.set()
+
+    def _stream_attempt(self, model, prompt: str, history: Optional[List], deadline: Optional[float],
+                        first_token: threading.Event, cancel: threading.Event) -> Tuple[str, Any]:
+        """Stream one generation, signalling first_token on the first chunk and stopping if cancelled"""
+        
+        def run() -> Tuple[str, Any]:
+            if cancel.is_set():
+                raise RuntimeError("Attempt cancelled before it started")
+            request_options = {}
+            if deadline is not None:
+                request_options["timeout"] = max(0.1, deadline - time.monotonic())
+            
+            session = model.start_chat(history=history) if history is not None else None
+            send = session.send_message if session is not None else model.generate_content
+            response = send(prompt, stream=True, request_options=request_options)
+            
+            parts = []
+            for chunk in response:
+                first_token.set()
+                if cancel.is_set():
+                    raise RuntimeError("Attempt cancelled")
+                parts.append(self._chunk_text(chunk))
+            return "".join(parts), session
+        
+        return gemini_limiter.call(run)
+
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        """Access text of a streamed chunk based on the API"""
+        try:
+            return chunk.text
+        except (AttributeError, ValueError):
+            if hasattr(chunk, 'parts'):
+                return ''.join(part.text for part in chunk.parts)
+            # Handle case where response structure is different
+            print("Response structure is unexpected:", type(chunk))
+            return str(chunk)
@@ -0,0 +1,206 @@
+import json
+import time
+import hashlib
+import datetime
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class ContextCacheManager:
+    """
+    Keep one Gemini explicit context cache for a stable prompt prefix
+
+    The prefix (system instruction plus a few pinned contents) is uploaded once
+    and every turn uses a model bound to the cache, so only the recent history and
+    the new message are processed as fresh input tokens. The cache is extended
+    shortly before it expires, replaced when the prefix changes, and not retried
+    for a while if creating it fails, e.g. because the prefix is below the
+    model's minimum cacheable size.
+
+    Network calls run outside the lock: while a cache is being created, other
+    turns for that prefix are sent uncached instead of waiting. A replaced cache
+    is not deleted, since turns that already hold its model may still be
+    streaming; its TTL is shortened to retire_grace_seconds and Gemini expires it.
+
+    The caching module and model factory are injectable so the manager can be
+    exercised against a mock client.
+    """
+
+    def __init__(self, model_name: str, generation_config: Optional[Dict[str, Any]] = None,
+                 ttl_seconds: int = 3600, refresh_margin_seconds: int = 300, retire_grace_seconds: int = 600,
+                 caching_module: Any = None, model_factory: Optional[Callable[..., Any]] = None,
+                 clock: Callable[[], float] = time.time):
+        """
+        Args:
+            model_name: Versioned model that supports caching (e.g. "models/gemini-2.0-flash-001")
+            generation_config: Generation settings for models bound to the cache
+            ttl_seconds: Lifetime requested for (and extended on) the cache
+            refresh_margin_seconds: Extend the TTL when less than this remains
+            retire_grace_seconds: How long a replaced cache stays usable for turns still running on it
+            caching_module: Provides CachedContent.create; defaults to google.generativeai.caching
+            model_factory: Builds a model from cached_content; defaults to GenerativeModel.from_cached_content
+            clock: Time source in seconds
+        """
+        if caching_module is None or model_factory is None:
+            import google.generativeai as genai
+            from google.generativeai import caching
+            caching_module = caching_module or caching
+            model_factory = model_factory or genai.GenerativeModel.from_cached_content
+
+        self.model_name = model_name
+        self.generation_config = generation_config
+        self.ttl_seconds = ttl_seconds
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retire_grace_seconds = retire_grace_seconds
+        self._caching = caching_module
+        self._model_factory = model_factory
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._cache = None
+        self._key: Optional[str] = None
+        self._model = None
+        self._expires_at = 0.0
+        self._refreshing = False
+        self._creating: Set[str] = set()
+        self._failed: Dict[str, float] = {}
+        # Replaced caches and when they expire, deleted on close()
+        self._retired: List[Tuple[Any, float]] = []
+
+        self.created = 0
+        self.hits = 0
+        self.refreshed = 0
+        self.failures = 0
+
+    def get_model(self, system_instruction: str, contents: List[Dict[str, Any]]):
+        """
+        Return a model bound to a cache of this prefix, or None if caching is unavailable
+
+        Args:
+            system_instruction: System prompt to cache
+            contents: Stable conversation prefix to cache along with it
+        """
+        key = self._prefix_key(system_instruction, contents)
+        with self._lock:
+            now = self._clock()
+            cache, model = self._cache, self._model
+            if key == self._key and cache is not None and now < self._expires_at:
+                if self._expires_at - now >= self.refresh_margin_seconds or self._refreshing:
+                    self.hits += 1
+                    return model
+                self._refreshing = True
+            else:
+                if self._failed.get(key, 0) > now or key in self._creating:
+                    return None
+                self._creating.add(key)
+                cache = None
+
+        if cache is not None:
+            return self._refresh(cache, model, now)
+        return self._create(key, system_instruction, contents, now)
+
+    def _refresh(self, cache, model, now: float):
+        """Extend the active cache's TTL; on failure it is recreated on the next turn"""
+        try:
+            cache.update(ttl=datetime.timedelta(seconds=self.ttl_seconds))
+        except Exception as e:
+            logger.warning(f"Could not extend context cache, recreating it: {str(e)}")
+            with self._lock:
+                self._refreshing = False
+                if self._cache is cache:
+                    self._expires_at = 0.0
+            return None
+
+        with self._lock:
+            self._refreshing = False
+            if self._cache is cache:
+                self._expires_at = now + self.ttl_seconds
+            self.refreshed += 1
+            self.hits += 1
+        return model
+
+    def _create(self, key: str, system_instruction: str, contents: List[Dict[str, Any]], now: float):
+        """Upload the prefix and make it the active cache, retiring the one it replaces"""
+        try:
+            cache = self._caching.CachedContent.create(
+                model=self.model_name,
+                display_name=f"prefix-{key[:16]}",
+                system_instruction=system_instruction,
+                contents=contents or None,
+                ttl=datetime.timedelta(seconds=self.ttl_seconds)
+            )
+            model = self._model_factory(cached_content=cache, generation_config=self.generation_config)
+        except Exception as e:
+            with self._lock:
+                self._creating.discard(key)
+                self.failures += 1
+                self._failed = {k: until for k, until in self._failed.items() if until > now}
+                self._failed[key] = now + self.ttl_seconds
+            logger.warning(f"Context caching unavailable for this prefix, sending it uncached: {str(e)}")
+            return None
+
+        with self._lock:
+            self._creating.discard(key)
+            replaced, replaced_expires_at = self._cache, self._expires_at
+            self._cache, self._key, self._model = cache, key, model
+            self._expires_at = now + self.ttl_seconds
+            self.created += 1
+        logger.info(f"Created context cache for prefix {key[:16]} ({len(contents)} pinned contents)")
+
+        if replaced is not None:
+            self._retire(replaced, replaced_expires_at)
+        return model
+
+    def _retire(self, cache, expires_at: float):
+        """Let a replaced cache expire after a grace period instead of deleting it under running turns"""
+        now = self._clock()
+        grace = min(self.retire_grace_seconds, expires_at - now)
+        if grace > 0:
+            try:
+                cache.update(ttl=datetime.timedelta(seconds=grace))
+            except Exception as e:
+                logger.warning(f"Could not shorten replaced context cache, it expires with its original TTL: {str(e)}")
+                grace = expires_at - now
+        with self._lock:
+            self._retired = [(c, until) for c, until in self._retired if until > now]
+            if grace > 0:
+                self._retired.append((cache, now + grace))
+
+    def close(self):
+        """Delete the active and retired caches so they stop accruing storage cost"""
+        with self._lock:
+            caches = [c for c, _ in self._retired]
+            if self._cache is not None:
+                caches.append(self._cache)
+            self._retired = []
+            self._cache, self._key, self._model = None, None, None
+            self._expires_at = 0.0
+
+        for cache in caches:
+            try:
+                cache.delete()
+            except Exception as e:
+                logger.warning(f"Could not delete context cache: {str(e)}")
+
+    def _prefix_key(self, system_instruction: str, contents: List[Dict[str, Any]]) -> str:
+        payload = json.dumps([self.model_name, system_instruction, contents], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for the context cache"""
+        with self._lock:
+            return {
+                "model": self.model_name,
+                "active": self._cache is not None,
+                "retired": len(self._retired),
+                "expires_in": max(0.0, self._expires_at - self._clock()) if self._cache is not None else 0.0,
+                "created": self.created,
+                "hits": self.hits,
+                "refreshed": self.refreshed,
+                "failures": self.failures
+            }
@@ -0,0 +1,57 @@
+import os
+from typing import Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+class LLMDeadlineExceeded(Exception):
+    """Raised when no model produced a complete answer before the call deadline"""
+
+    def __init__(self, role: str, deadline_ms: int):
+        super().__init__(f"{role} did not answer within {deadline_ms} ms")
+        self.role = role
+        self.deadline_ms = deadline_ms
+
+
+class LLMPolicy:
+    """Model choice, deadline and hedging settings for one BaseLLM role"""
+
+    def __init__(self, role: str, model_name: str, fallback_model_name: Optional[str] = None,
+                 deadline_ms: Optional[int] = None, hedge_after_ms: Optional[int] = None):
+        """
+        Args:
+            role: Name used in logs and errors (e.g. "main", "web_agent")
+            model_name: Primary Gemini model
+            fallback_model_name: Model tried when the primary fails or is hedged; None disables fallback
+            deadline_ms: Overall time budget for one generation; None means no deadline
+            hedge_after_ms: Start the fallback in parallel if the primary has not streamed its
+                first token after this long; None disables hedging
+        """
+        self.role = role
+        self.model_name = model_name
+        self.fallback_model_name = fallback_model_name or None
+        self.deadline_ms = deadline_ms or None
+        self.hedge_after_ms = hedge_after_ms or None
+
+    @classmethod
+    def from_env(cls, role: str, prefix: str, default_model: str, default_fallback: str = "",
+                 default_deadline_ms: int = 60000) -> "LLMPolicy":
+        """
+        Build a policy from environment variables
+
+        Reads {prefix}_MODEL, {prefix}_FALLBACK_MODEL, {prefix}_DEADLINE_MS and
+        {prefix}_HEDGE_AFTER_MS. An empty or zero value disables that feature.
+        """
+        return cls(
+            role=role,
+            model_name=os.getenv(f"{prefix}_MODEL", default_model),
+            fallback_model_name=os.getenv(f"{prefix}_FALLBACK_MODEL", default_fallback),
+            deadline_ms=int(os.getenv(f"{prefix}_DEADLINE_MS", str(default_deadline_ms)) or 0),
+            hedge_after_ms=int(os.getenv(f"{prefix}_HEDGE_AFTER_MS", "0") or 0)
+        )
+
+    def __repr__(self) -> str:
+        return (f"LLMPolicy(role={self.role!r}, model={self.model_name!r}, fallback={self.fallback_model_name!r}, "
+                f"deadline_ms={self.deadline_ms}, hedge_after_ms={self.hedge_after_ms})")
@@ -1,22 +1,60 @@
 from app.services.llm.base_llm import BaseLLM
+from app.services.llm.context_cache import ContextCacheManager
+from app.services.llm.llm_policy import LLMDeadlineExceeded, LLMPolicy
 from app.services.llm.web_agent_llm import WebAgentLLM
 from app.services.memory_service import MemoryService
+from app.services.rate_limit import gemini_limiter
 
+import os
 import datetime
+import hashlib
+import threading
+from collections import OrderedDict
+import google.generativeai as genai
 from typing import List, Dict, Any, Optional
 
 class MainLLM(BaseLLM):
     """Main LLM service for handling primary chat interactions"""
     
-    def __init__(self, history: Optional[List[Dict]] = None):
+    def __init__(self):
         """Initialize the Main LLM with the memory service"""
-        super().__init__(model_name="gemini-2.0-flash", is_main=True, history=history)  # Using faster model for main interactions
+        # Using faster model for main interactions; model, fallback, deadline and hedging are set via MAIN_LLM_* env
+        policy = LLMPolicy.from_env("main", "MAIN_LLM", default_model="gemini-2.0-flash", default_fallback="gemini-1.5-flash")
+        super().__init__(is_main=True, policy=policy)
         self.memory_service = MemoryService()
         self.memory_service.initialize()  # Initialize the ChromaDB connection
         self.web_agent = WebAgentLLM()
         
-    def process_chat(self, message: str, with_search: bool = True) -> str:
-        """Process a chat message with memory context"""
+        # Optional Gemini explicit context caching of the stable prefix (system prompt + summarized older history)
+        self.context_cache = None
+        self.context_cache_block = int(os.getenv("MAIN_LLM_CONTEXT_CACHE_BLOCK", "20"))
+        if os.getenv("MAIN_LLM_CONTEXT_CACHE", "0").lower() in ("1", "true", "yes"):
+            self.context_cache = ContextCacheManager(
+                model_name=os.getenv("MAIN_LLM_CONTEXT_CACHE_MODEL", f"models/{self.model_name}-001"),
+                generation_config=self.generation_config,
+                ttl_seconds=int(os.getenv("MAIN_LLM_CONTEXT_CACHE_TTL", "3600")),
+                refresh_margin_seconds=int(os.getenv("MAIN_LLM_CONTEXT_CACHE_REFRESH_MARGIN", "300")),
+                retire_grace_seconds=int(os.getenv("MAIN_LLM_CONTEXT_CACHE_RETIRE_GRACE", "600"))
+            )
+            self.summary_model = genai.GenerativeModel(self.model_name)
+            self._summaries: "OrderedDict[str, str]" = OrderedDict()
+            self._summaries_lock = threading.Lock()
+        
+    def process_chat(self, message: str, with_search: bool = True, history: Optional[List[Dict]] = None,
+                     prefetched=None, older_history: Optional[List[Dict]] = None) -> str:
+        """
+        Process a chat message with memory context
+        
+        The turn runs in a fresh chat session rebuilt from history (the recent
+        messages loaded from SQLite), so no conversation state has to survive
+        between requests (required when serving with several workers).
+        
+        If prefetched (a PrefetchEntry for a matching draft) is given, its search
+        results and memory context are reused instead of being fetched again.
+        
+        older_history is the block of messages before history; with context
+        caching enabled it is summarized and cached along with the system prompt.
+        """
         # Get current timestamp for context
         current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
@@ -24,11 +62,19 @@ class MainLLM(BaseLLM):
         context_parts = [f"Current time: {current_time} \n"]
         
         if with_search:
-            web_response = self.web_agent.process_web_query(message)
-            context_parts.append(f"Web search results:\n{web_response}")
+            try:
+                prepared_results = prefetched.search_results if prefetched is not None else None
+                web_response = self.web_agent.process_web_query(message, prepared_results=prepared_results)
+                context_parts.append(f"Web search results:\n{web_response}")
+            except LLMDeadlineExceeded as e:
+                # Answer from memory and training rather than stalling the whole turn
+                print(f"Skipping web search context: {str(e)}")
 
         # Add memory context if enabled
-        memory_context = self.memory_service.get_relevant_context(message)
+        if prefetched is not None and prefetched.memory_context is not None:
+            memory_context = prefetched.memory_context
+        else:
+            memory_context = self.memory_service.get_relevant_context(message)
         if memory_context:
             context_parts.append(f"Memory context:\n{memory_context}")
         
@@ -39,10 +85,60 @@ class MainLLM(BaseLLM):
         prompt = f"Context information (use this to inform your response, but don't explicitly mention it)(for web search results : insert link and references):\n{full_context}\n\nUser message: {message}"
         
         # Generate response
-        response = self.generate_response(prompt)
+        chat, history_prefix = self._new_turn_chat(history or [], older_history)
+        response = self.generate_response(prompt, chat=chat, history_prefix=history_prefix)
         
         # Store interaction in memory
         self.memory_service.store_interaction(message, "user")
         self.memory_service.store_interaction(response, "model")    
                 
-        return response
\ No newline at end of file
+        return response
+
+    def _new_turn_chat(self, history: List[Dict], older_history: Optional[List[Dict]]):
+        """
+        Start this turn's chat session
+        
+        Returns:
+            The session and, if it runs on a cached model, the cached contents a
+            fallback model has to be sent explicitly
+        """
+        prefix = []
+        if older_history and self.context_cache is not None:
+            summary = self._summarize_history(older_history)
+            prefix = [
+                {"role": "user", "parts": f"Summary of our earlier conversation:\n{summary}"},
+                {"role": "model", "parts": "Understood, I will keep this in mind."}
+            ]
+        
+        if self.context_cache is not None:
+            cached_model = self.context_cache.get_model(self.system_instruction, prefix)
+            if cached_model is not None:
+                return cached_model.start_chat(history=history), prefix
+        
+        # Uncached: send the same prefix as ordinary history
+        return self.new_chat(prefix + history), None
+
+    def _summarize_history(self, older_history: List[Dict]) -> str:
+        """Summarize a block of older messages once; the result is the stable, cacheable prefix"""
+        transcript = "\n".join(f"{turn['role']}: {turn['parts']}" for turn in older_history)
+        key = hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+        with self._summaries_lock:
+            if key in self._summaries:
+                return self._summaries[key]
+        
+        try:
+            response = gemini_limiter.call(
+                self.summary_model.generate_content,
+                f"Summarize this conversation in a few sentences, keeping names, facts, preferences and open questions:\n{transcript}"
+            )
+            summary = response.text
+        except Exception as e:
+            # The verbatim transcript is just as stable, only larger
+            print(f"Error summarizing older history: {str(e)}")
+            summary = transcript
+        
+        with self._summaries_lock:
+            self._summaries[key] = summary
+            while len(self._summaries) > 8:
+                self._summaries.popitem(last=False)
+        return summary
@@ -1,21 +1,93 @@
 from app.services.llm.base_llm import BaseLLM
+from app.services.llm.llm_policy import LLMDeadlineExceeded, LLMPolicy
 from app.services.search_service import SearchService
+from app.services.single_flight import SingleFlight, normalize_query
+from app.services.rate_limit import UpstreamBusyError
 import logging
+import threading
 from typing import List, Dict, Any, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Concurrent rewrites of the same user query share a single LLM call
+_rewrite_flight = SingleFlight("query_rewrite")
+
 class WebAgentLLM(BaseLLM):
     """Web agent LLM service for handling web searches and providing up-to-date information"""
     
     def __init__(self):
         """Initialize the web agent LLM with search service"""
-        super().__init__(model_name="gemini-1.5-flash", is_main=False)  # WebAgent doesn't need history, it's not a multiturn chat
+        # WebAgent doesn't need history, it's not a multiturn chat; policy is set via WEB_AGENT_LLM_* env
+        policy = LLMPolicy.from_env("web_agent", "WEB_AGENT_LLM", default_model="gemini-1.5-flash",
+                                    default_fallback="gemini-2.0-flash", default_deadline_ms=30000)
+        super().__init__(is_main=False, policy=policy)
         self.search_service = SearchService()
         
-    def process_web_query(self, query: str, max_extractions: int = 3, max_content_length: int = 2000) -> str:
+    def prepare_search(self, query: str, max_extractions: int = 3, max_content_length: int = 2000,
+                       cancel: Optional[threading.Event] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Rewrite the query, search the web and extract content from the top results
+        
+        This is the slow, upstream-bound half of process_web_query; it can be run
+        ahead of time (e.g. as a speculative prefetch) and its result passed back in.
+        
+        Args:
+            query: User's query to search for
+            max_extractions: Maximum number of web pages to extract detailed content from
+            max_content_length: Maximum length of content to extract from each page
+            cancel: Optional event; when set, the remaining stages are skipped
+            
+        Returns:
+            Search results with extracted content, or None if cancelled
+        """
+        # Detect if query is not in English and keep it as is, rather than generating a search query
+        is_likely_english = all(ord(char) < 128 for char in query if char.isalpha())
+        
+        if is_likely_english:
+            # For English queries, generate an optimized search query
+            logger.info(f"Original query: {query}")
+            search_query = _rewrite_flight.do(
+                normalize_query(query),
+                self.generate_response,
+                f"Convert this user query into an effective web search query. Only respond with the search query, nothing else: {query}"
+            )
+            logger.info(f"Generated search query: {search_query}")
+        else:
+            # For non-English queries, use the original query
+            search_query = query
+            logger.info(f"Using original non-English query for search: {search_query}")
+        
+        if cancel is not None and cancel.is_set():
+            return None
+            
+        # Perform web search with enhanced content extraction
+        detailed_results = self.search_service.search_and_extract(
+            search_query, 
+            max_extractions=max_extractions, 
+            max_content_length=max_content_length,
+            cancel=cancel
+        )
+        
+        # Try with original query if generated query didn't get results
+        if not detailed_results and is_likely_english and search_query != query:
+            if cancel is not None and cancel.is_set():
+                return None
+            logger.info("No results with generated query, trying original query")
+            detailed_results = self.search_service.search_and_extract(
+                query, 
+                max_extractions=max_extractions, 
+                max_content_length=max_content_length,
+                cancel=cancel
+            )
+        
+        if cancel is not None and cancel.is_set():
+            return None
+        return detailed_results
+        
+    def process_web_query(self, query: str, max_extractions: int = 3, max_content_length: int = 2000,
+                          prepared_results: Optional[List[Dict[str, Any]]] = None) -> str:
         """
         Process a web query and return information from the web with detailed content extraction
         
@@ -23,41 +95,20 @@ class WebAgentLLM(BaseLLM):
             query: User's query to search for
             max_extractions: Maximum number of web pages to extract detailed content from
             max_content_length: Maximum length of content to extract from each page
+            prepared_results: Results of an earlier prepare_search for this query, if any
             
         Returns:
             Comprehensive response based on extracted web content
         """
         try:
-            # Detect if query is not in English and keep it as is, rather than generating a search query
+            # Detect if query is not in English so the answer can follow its language
             is_likely_english = all(ord(char) < 128 for char in query if char.isalpha())
             
-            if is_likely_english:
-                # For English queries, generate an optimized search query
-                logger.info(f"Original query: {query}")
-                search_query = self.generate_response(
-                    f"Convert this user query into an effective web search query. Only respond with the search query, nothing else: {query}"
-                )
-                logger.info(f"Generated search query: {search_query}")
+            if prepared_results is not None:
+                logger.info(f"Reusing {len(prepared_results)} prefetched search results")
+                detailed_results = prepared_results
             else:
-                # For non-English queries, use the original query
-                search_query = query
-                logger.info(f"Using original non-English query for search: {search_query}")
-                
-            # Perform web search with enhanced content extraction
-            detailed_results = self.search_service.search_and_extract(
-                search_query, 
-                max_extractions=max_extractions, 
-                max_content_length=max_content_length
-            )
-            
-            # Try with original query if generated query didn't get results
-            if not detailed_results and is_likely_english and search_query != query:
-                logger.info("No results with generated query, trying original query")
-                detailed_results = self.search_service.search_and_extract(
-                    query, 
-                    max_extractions=max_extractions, 
-                    max_content_length=max_content_length
-                )
+                detailed_results = self.prepare_search(query, max_extractions, max_content_length)
             
             # If still no results, return a helpful message
             if not detailed_results:
@@ -123,6 +174,9 @@ Since I couldn't retrieve web results, I'll answer based on my training:
             
             return response
             
+        except (UpstreamBusyError, LLMDeadlineExceeded):
+            # Gemini is over quota or too slow; a fallback generation would only hit the same limit
+            raise
         except Exception as e:
             logger.exception(f"Error in process_web_query: {str(e)}")
             return f"""I encountered an error while trying to search for information about your query: "{query}".
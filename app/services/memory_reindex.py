@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import google.generativeai as genai
+from app.services.memory_service import MemoryService, read_active_collection, write_active_collection
+from app.services.rate_limit import gemini_limiter
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Row = Tuple[int, str, str, str]
+
+
+class MemoryReindexer:
+    """
+    Rebuild the memory collection (Chroma or NumPy backend) from the SQLite chat log
+
+    Rows are streamed from the chat table in id order, embedded in batches with
+    several requests in flight, and bulk-upserted into a fresh collection. After
+    every window a checkpoint records the last indexed id so an interrupted run
+    resumes where it stopped. When all rows are in, the logical collection name
+    is pointed at the new collection in one atomic file replace.
+
+    Servers must be stopped while it runs: rows they save during the reindex
+    would only reach the old collection, and the embedded Chroma client and the
+    NumPy store must not be written by two processes.
+    """
+
+    def __init__(self, db_file: str = "./data/myai.db", batch_size: int = 100, parallelism: int = 4,
+                 checkpoint_path: Optional[str] = None):
+        """
+        Args:
+            db_file: SQLite database holding the chat table
+            batch_size: Texts per embedding request (Gemini accepts up to 100)
+            parallelism: Embedding requests in flight at once
+            checkpoint_path: Where to keep resume state (default: <persist dir>/reindex_checkpoint.json)
+        """
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.parallelism = parallelism
+        self.memory_service = MemoryService()
+        self.checkpoint_path = Path(checkpoint_path or Path(self.memory_service.persist_dir) / "reindex_checkpoint.json")
+
+    def run(self, resume: bool = True, drop_old: bool = False) -> int:
+        """
+        Reindex every chat row and swap the new collection in
+
+        Args:
+            resume: Continue from an existing checkpoint for the same collection and embedding model
+            drop_old: Delete the previously active collection after the swap
+
+        Returns:
+            Number of rows indexed in this run
+        """
+        service = self.memory_service
+        service.initialize()
+        if service.collection is None:
+            raise RuntimeError(f"Could not open the {service.backend} memory backend")
+
+        checkpoint = self._load_checkpoint() if resume else None
+        if checkpoint is None:
+            stamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+            checkpoint = {
+                "collection_name": service.collection_name,
+                "target": f"{service.collection_name}_{stamp}",
+                "embedding_model": service.embedding_model,
+                "last_id": 0,
+                "indexed": 0
+            }
+        else:
+            logger.info(f"Resuming into '{checkpoint['target']}' after row id {checkpoint['last_id']}")
+
+        target = service.open_collection(checkpoint["target"])
+
+        with sqlite3.connect(self.db_file) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM chat WHERE id > ?", (checkpoint["last_id"],))
+            remaining = cursor.fetchone()[0]
+            logger.info(f"Reindexing {remaining} rows into '{checkpoint['target']}' "
+                        f"(batch size {self.batch_size}, {self.parallelism} parallel requests)")
+
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="reindex") as executor:
+                # Rows saved after the first pass started (e.g. by a server stopped late) are picked up by
+                # catching up from the checkpoint until a pass finds nothing new
+                indexed = 0
+                while True:
+                    caught_up = self._index_pending(conn, target, executor, checkpoint, indexed, remaining, started)
+                    if not caught_up:
+                        break
+                    indexed += caught_up
+
+                old_name = read_active_collection(service.persist_dir, service.collection_name)
+                write_active_collection(service.persist_dir, service.collection_name, checkpoint["target"])
+                # Nothing writes to the target after this point: it now belongs to the servers
+                logger.info(f"'{service.collection_name}' now served by '{checkpoint['target']}' (was '{old_name}')")
+
+        if drop_old and old_name != checkpoint["target"]:
+            try:
+                service.delete_collection(old_name)
+                logger.info(f"Deleted old collection '{old_name}'")
+            except Exception as e:
+                logger.warning(f"Could not delete old collection '{old_name}': {str(e)}")
+
+        self.checkpoint_path.unlink(missing_ok=True)
+        return indexed
+
+    def _index_pending(self, conn: sqlite3.Connection, target, executor: ThreadPoolExecutor,
+                       checkpoint: Dict[str, Any], indexed: int, remaining: int, started: float) -> int:
+        """Index every row after the checkpoint's last id in one pass, returning how many were read"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, timestamp, role, parts FROM chat WHERE id > ? ORDER BY id", (checkpoint["last_id"],))
+        count = 0
+        while True:
+            window = cursor.fetchmany(self.batch_size * self.parallelism)
+            if not window:
+                return count
+            batches = [window[i:i + self.batch_size] for i in range(0, len(window), self.batch_size)]
+
+            # Embed the window's batches concurrently, then write them in id order
+            for batch, embeddings in zip(batches, executor.map(self._embed_batch, batches)):
+                self._upsert_batch(target, batch, embeddings)
+
+            count += len(window)
+            checkpoint["last_id"] = window[-1][0]
+            checkpoint["indexed"] += len(window)
+            self._save_checkpoint(checkpoint)
+            self._report_progress(indexed + count, max(remaining, indexed + count), started)
+
+    def _embed_batch(self, batch: List[Row]) -> List[Optional[List[float]]]:
+        """Embed one batch with a single request; rows with empty text get no embedding"""
+        texts = [row[3] for row in batch if row[3] and row[3].strip()]
+        if not texts:
+            return [None] * len(batch)
+        result = gemini_limiter.call(
+            genai.embed_content,
+            model=self.memory_service.embedding_model,
+            content=texts,
+            task_type="retrieval_query"
+        )
+        vectors = iter(result["embedding"])
+        return [next(vectors) if row[3] and row[3].strip() else None for row in batch]
+
+    @staticmethod
+    def _upsert_batch(collection, batch: List[Row], embeddings: List[Optional[List[float]]]):
+        """Write one batch; ids derive from the SQLite row id so replays after a crash are idempotent"""
+        ids, vectors, documents, metadatas = [], [], [], []
+        for (row_id, timestamp, role, parts), embedding in zip(batch, embeddings):
+            if embedding is None:
+                continue
+            ids.append(f"chat_{row_id}")
+            vectors.append(embedding)
+            documents.append(parts)
+            metadatas.append({"role": role, "timestamp": timestamp})
+        if ids:
+            collection.upsert(ids=ids, embeddings=vectors, documents=documents, metadatas=metadatas)
+
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        try:
+            checkpoint = json.loads(self.checkpoint_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        service = self.memory_service
+        if (checkpoint.get("collection_name") != service.collection_name
+                or checkpoint.get("embedding_model") != service.embedding_model):
+            logger.info("Ignoring checkpoint for a different collection or embedding model")
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]):
+        tmp = self.checkpoint_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(checkpoint), encoding="utf-8")
+        os.replace(tmp, self.checkpoint_path)
+
+    @staticmethod
+    def _report_progress(indexed: int, total: int, started: float):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = indexed / elapsed
+        eta = (total - indexed) / rate if rate > 0 else float("inf")
+        percent = 100 * indexed / total if total else 100
+        logger.info(f"Indexed {indexed}/{total} rows ({percent:.1f}%) - {rate:.1f} rows/s - ETA {eta:.0f}s")
@@ -1,14 +1,22 @@
-import chromadb
 import os
+import shutil
 import logging
-from chromadb.config import Settings
-from chromadb.utils import embedding_functions
 import google.generativeai as genai
 from dotenv import load_dotenv
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 import datetime
 import uuid
+from app.services.rate_limit import gemini_limiter
+from app.services.vector_store import NumpyVectorStore
+
+try:
+    # Only needed for the default "chroma" backend
+    import chromadb
+    from chromadb.config import Settings
+    from chromadb.utils import embedding_functions
+except ImportError:
+    chromadb = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,10 +25,40 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+def active_collection_pointer(persist_dir: str, collection_name: str) -> Path:
+    """Path of the file naming the collection currently serving collection_name"""
+    return Path(persist_dir) / f"{collection_name}.active"
+
+def read_active_collection(persist_dir: str, collection_name: str) -> str:
+    """Resolve the logical collection name to the physical collection in use"""
+    pointer = active_collection_pointer(persist_dir, collection_name)
+    try:
+        return pointer.read_text(encoding="utf-8").strip() or collection_name
+    except FileNotFoundError:
+        return collection_name
+
+def write_active_collection(persist_dir: str, collection_name: str, active_name: str):
+    """Atomically point the logical collection name at another physical collection"""
+    pointer = active_collection_pointer(persist_dir, collection_name)
+    tmp = pointer.with_suffix(".active.tmp")
+    tmp.write_text(active_name, encoding="utf-8")
+    os.replace(tmp, pointer)
+
 class MemoryService:
     def __init__(self):
         self.persist_dir = os.getenv("CHROMADB_PERSIST_DIR", "./chroma_db")
         self.collection_name = os.getenv("CHROMADB_COLLECTION", "memory")
+        # "chroma" (default) or "numpy" for the in-process memory-mapped vector store
+        self.backend = os.getenv("MEMORY_BACKEND", "chroma").lower()
+        self.numpy_ivf_threshold = int(os.getenv("NUMPY_STORE_IVF_THRESHOLD", "50000"))
+        self.numpy_nprobe = int(os.getenv("NUMPY_STORE_NPROBE", "8"))
+        # Optional Chroma server shared by all workers; an embedded PersistentClient keeps a per-process index
+        self.chroma_host = os.getenv("CHROMADB_HOST")
+        self.chroma_port = int(os.getenv("CHROMADB_PORT", "8001"))
+        self.embedding_model = os.getenv("CHROMADB_EMBEDDING_MODEL", "models/embedding-001")
+        # Physical collection behind collection_name; a reindex swaps it via the .active pointer file
+        self.active_collection_name = self.collection_name
+        self._pointer_mtime = None
         self.client = None
         self.collection = None
         self.embedding_function = None
@@ -33,39 +71,92 @@ class MemoryService:
     
     def initialize(self):
         """Initialize ChromaDB client and collection"""
+        if self.backend == "numpy":
+            self._initialize_numpy()
+            return
+        if chromadb is None:
+            logger.error("chromadb is not installed; install it or set MEMORY_BACKEND=numpy")
+            return
         try:
-            logger.info(f"Initializing ChromaDB with persist directory: {self.persist_dir}")
-            
-            # Create persistent client with telemetry disabled
-            self.client = chromadb.PersistentClient(
-                path=self.persist_dir,
-                settings=Settings(anonymized_telemetry=False)
-            )
+            if self.chroma_host:
+                logger.info(f"Connecting to ChromaDB server at {self.chroma_host}:{self.chroma_port}")
+                self.client = chromadb.HttpClient(
+                    host=self.chroma_host,
+                    port=self.chroma_port,
+                    settings=Settings(anonymized_telemetry=False)
+                )
+            else:
+                logger.info(f"Initializing ChromaDB with persist directory: {self.persist_dir}")
+                
+                # Create persistent client with telemetry disabled
+                self.client = chromadb.PersistentClient(
+                    path=self.persist_dir,
+                    settings=Settings(anonymized_telemetry=False)
+                )
             
             # Set up embedding function for Gemini
             self._setup_embedding_function()
             
+            # Resolve which physical collection is active
+            self._pointer_mtime = self._read_pointer_mtime()
+            self.active_collection_name = read_active_collection(self.persist_dir, self.collection_name)
+            
             # Check if collection exists first
             collections = self.client.list_collections()
-            collection_exists = any(c.name == self.collection_name for c in collections)
+            collection_exists = any(c.name == self.active_collection_name for c in collections)
             
             # Get or create collection without throwing exception
             if collection_exists:
                 self.collection = self.client.get_collection(
-                    name=self.collection_name,
+                    name=self.active_collection_name,
                     embedding_function=self.embedding_function
                 )
-                logger.info(f"Connected to existing ChromaDB collection '{self.collection_name}'")
+                logger.info(f"Connected to existing ChromaDB collection '{self.active_collection_name}'")
             else:
                 self.collection = self.client.create_collection(
-                    name=self.collection_name,
+                    name=self.active_collection_name,
                     embedding_function=self.embedding_function
                 )
-                logger.info(f"Created new ChromaDB collection '{self.collection_name}'")
+                logger.info(f"Created new ChromaDB collection '{self.active_collection_name}'")
             
         except Exception as e:
             logger.error(f"Error initializing ChromaDB: {str(e)}")
     
+    def _initialize_numpy(self):
+        """Open the memory-mapped NumPy store for the active collection"""
+        try:
+            self._pointer_mtime = self._read_pointer_mtime()
+            self.active_collection_name = read_active_collection(self.persist_dir, self.collection_name)
+            self.collection = self.open_collection(self.active_collection_name)
+            logger.info(f"Opened NumPy vector store '{self.active_collection_name}' with {self.collection.count()} rows")
+        except Exception as e:
+            logger.error(f"Error initializing NumPy vector store: {str(e)}")
+    
+    def open_collection(self, name: str):
+        """Get or create a physical collection by name on the configured backend"""
+        if self.backend == "numpy":
+            return NumpyVectorStore(
+                str(Path(self.persist_dir) / "numpy" / name),
+                embedding_function=self._embed_texts,
+                ivf_threshold=self.numpy_ivf_threshold,
+                nprobe=self.numpy_nprobe
+            )
+        return self.client.get_or_create_collection(name=name, embedding_function=self.embedding_function)
+    
+    def delete_collection(self, name: str):
+        """Delete a physical collection by name on the configured backend"""
+        if self.backend == "numpy":
+            shutil.rmtree(Path(self.persist_dir) / "numpy" / name)
+        else:
+            self.client.delete_collection(name)
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with one batched Gemini request (same model and task type as the Chroma backend)"""
+        if not texts:
+            return []
+        result = genai.embed_content(model=self.embedding_model, content=texts, task_type="retrieval_query")
+        return result["embedding"]
+    
     def _setup_embedding_function(self):
         """Set up the embedding function for Gemini"""
         try:
@@ -76,6 +167,7 @@ class MemoryService:
             # Use ChromaDB's built-in Google embedding function
             self.embedding_function = embedding_functions.GoogleGenerativeAiEmbeddingFunction(
                 api_key=api_key,
+                model_name=self.embedding_model,
                 task_type="retrieval_query"
             )
             logger.info("Successfully set up Gemini embedding function")
@@ -83,10 +175,20 @@ class MemoryService:
             logger.error(f"Error setting up embedding function: {str(e)}")
             self.embedding_function = None
     
+    def _read_pointer_mtime(self) -> Optional[float]:
+        try:
+            return active_collection_pointer(self.persist_dir, self.collection_name).stat().st_mtime
+        except FileNotFoundError:
+            return None
+    
+    def _collection_swapped(self) -> bool:
+        """Whether a reindex has pointed collection_name at a new collection since initialize()"""
+        return self._read_pointer_mtime() != self._pointer_mtime
+    
     def store_interaction(self, message: str, role: str):
         """Store a single message (user or AI) in ChromaDB with timestamp metadata"""
         try:
-            if not self.collection:
+            if not self.collection or self._collection_swapped():
                 self.initialize()
             
             # Get current timestamp
@@ -95,8 +197,9 @@ class MemoryService:
             # Create unique ID for this message
             message_id = f"{role}_{timestamp}_{str(uuid.uuid4())[:8]}"
             
-            # Store in ChromaDB with role and timestamp metadata
-            self.collection.add(
+            # Store in ChromaDB with role and timestamp metadata (embedding calls Gemini)
+            gemini_limiter.call(
+                self.collection.add,
                 documents=[message],
                 metadatas=[{
                     "role": role,  # "user" or "model"
@@ -114,12 +217,11 @@ class MemoryService:
     def get_relevant_context(self, query: str, n_results: int = 8, where: Optional[Dict[str, Any]] = None):
         """Retrieve relevant context based on query"""
         try:
-            if not self.collection:
+            if not self.collection or self._collection_swapped():
                 self.initialize()
                 
             # Check if collection is empty
-            collection_data = self.collection.get()
-            if len(collection_data['ids']) == 0:
+            if self.collection.count() == 0:
                 logger.info("ChromaDB collection is empty, no context to retrieve")
                 return ""
             
@@ -136,7 +238,8 @@ class MemoryService:
                 query = " "  # Use a space as minimal content if empty
             
             # Query ChromaDB for similar contexts
-            results = self.collection.query(
+            results = gemini_limiter.call(
+                self.collection.query,
                 query_texts=[query],
                 n_results=n_results,
                 where=formatted_where
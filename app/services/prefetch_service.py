@@ -0,0 +1,195 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional
+from dotenv import load_dotenv
+from app.services.single_flight import normalize_query
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class PrefetchEntry:
+    """Speculative search and memory results for one client's draft message"""
+
+    def __init__(self, client_id: str, draft: str, with_search: bool):
+        self.client_id = client_id
+        self.draft = draft
+        self.key = normalize_query(draft)
+        self.with_search = with_search
+        self.search_results: Optional[List[Dict[str, Any]]] = None
+        self.memory_context: Optional[str] = None
+        self.created = time.monotonic()
+        self.cancel = threading.Event()
+        self.done = threading.Event()
+
+
+class PrefetchService:
+    """
+    Warm search/extraction and memory retrieval while the user is still typing
+
+    Each client has at most one speculative job; a newer draft cancels the older
+    one. Jobs are throttled per client and capped globally so prefetching never
+    competes with real chat turns for more than a few upstream slots.
+    """
+
+    def __init__(self, get_llm: Callable[[], Any]):
+        """
+        Args:
+            get_llm: Returns the MainLLM whose web agent and memory service do the work
+        """
+        self._get_llm = get_llm
+        self.min_chars = int(os.getenv("PREFETCH_MIN_CHARS", "12"))
+        self.min_interval = float(os.getenv("PREFETCH_MIN_INTERVAL_MS", "1000")) / 1000
+        self.max_concurrency = int(os.getenv("PREFETCH_MAX_CONCURRENCY", "2"))
+        self.ttl = float(os.getenv("PREFETCH_TTL_SECONDS", "60"))
+        self.match_ratio = float(os.getenv("PREFETCH_MATCH_RATIO", "0.9"))
+        self.wait_seconds = float(os.getenv("PREFETCH_WAIT_SECONDS", "10"))
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, PrefetchEntry] = {}
+        self._last_scheduled: Dict[str, float] = {}
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="prefetch")
+
+        self.scheduled = 0
+        self.throttled = 0
+        self.cancelled = 0
+        self.completed = 0
+        self.hits = 0
+        self.misses = 0
+
+    def schedule(self, client_id: str, draft: str, with_search: bool) -> str:
+        """
+        Start a speculative job for a draft
+
+        Returns:
+            "scheduled", "duplicate", "too_short" or "throttled"
+        """
+        key = normalize_query(draft)
+        if len(key) < self.min_chars:
+            return "too_short"
+
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            current = self._entries.get(client_id)
+            if current is not None and current.key == key and (current.with_search or not with_search):
+                return "duplicate"
+            if now - self._last_scheduled.get(client_id, float("-inf")) < self.min_interval:
+                self.throttled += 1
+                return "throttled"
+            if not self._slots.acquire(blocking=False):
+                self.throttled += 1
+                return "throttled"
+            if current is not None:
+                current.cancel.set()
+                self.cancelled += 1
+            entry = PrefetchEntry(client_id, draft, with_search)
+            self._entries[client_id] = entry
+            self._last_scheduled[client_id] = now
+            self.scheduled += 1
+
+        self._executor.submit(self._run, entry)
+        return "scheduled"
+
+    def cancel(self, client_id: str):
+        """Cancel and drop the client's pending prefetch, if any"""
+        with self._lock:
+            entry = self._entries.pop(client_id, None)
+            if entry is not None:
+                entry.cancel.set()
+                self.cancelled += 1
+
+    def take(self, client_id: Optional[str], message: str, with_search: bool) -> Optional[PrefetchEntry]:
+        """
+        Claim the client's prefetch if its draft matches the final message
+
+        Waits (bounded by PREFETCH_WAIT_SECONDS) for a job that is still running,
+        since finishing it is cheaper than starting the same work over.
+        """
+        if not client_id:
+            return None
+        with self._lock:
+            entry = self._entries.pop(client_id, None)
+
+        if (entry is None or entry.cancel.is_set() or time.monotonic() - entry.created > self.ttl
+                or (with_search and not entry.with_search) or not self._matches(entry.key, normalize_query(message))):
+            if entry is not None:
+                entry.cancel.set()
+            self._count("misses")
+            return None
+
+        if not entry.done.wait(self.wait_seconds):
+            entry.cancel.set()
+            self._count("misses")
+            return None
+
+        self._count("hits")
+        logger.info(f"Using prefetched results for client {client_id}")
+        return entry
+
+    def _matches(self, draft_key: str, message_key: str) -> bool:
+        """
+        Whether a draft is close enough to the final message to reuse its results
+
+        The message must extend the draft: an edit inside the draft ("2023" to
+        "2024", "monday" to "sunday") is a different question even when the
+        strings are nearly identical. The similarity ratio then limits how much
+        may be appended.
+        """
+        if draft_key == message_key:
+            return True
+        if not message_key.startswith(draft_key):
+            return False
+        return SequenceMatcher(None, draft_key, message_key).ratio() >= self.match_ratio
+
+    def _run(self, entry: PrefetchEntry):
+        """Run one speculative job, checking for cancellation between stages"""
+        try:
+            llm = self._get_llm()
+            if not entry.cancel.is_set():
+                entry.memory_context = llm.memory_service.get_relevant_context(entry.draft)
+            if entry.with_search and not entry.cancel.is_set():
+                entry.search_results = llm.web_agent.prepare_search(entry.draft, cancel=entry.cancel)
+            if not entry.cancel.is_set():
+                self._count("completed")
+        except Exception as e:
+            logger.warning(f"Prefetch for client {entry.client_id} failed: {str(e)}")
+        finally:
+            entry.done.set()
+            self._slots.release()
+
+    def _evict_expired(self, now: float):
+        """Drop entries and throttle state older than the TTL (caller holds the lock)"""
+        for client_id, entry in list(self._entries.items()):
+            if now - entry.created > self.ttl:
+                entry.cancel.set()
+                del self._entries[client_id]
+        for client_id, last in list(self._last_scheduled.items()):
+            if now - last > self.ttl:
+                del self._last_scheduled[client_id]
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for speculative prefetching"""
+        with self._lock:
+            return {
+                "pending": len(self._entries),
+                "scheduled": self.scheduled,
+                "throttled": self.throttled,
+                "cancelled": self.cancelled,
+                "completed": self.completed,
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Load environment variables
+load_dotenv()
+
+
+class UpstreamRateLimited(Exception):
+    """Raised by a call wrapped in UpstreamLimiter.call when the upstream answered 429"""
+
+    def __init__(self, retry_after: Optional[float] = None):
+        super().__init__("Upstream answered 429 Too Many Requests")
+        self.retry_after = retry_after
+
+
+class UpstreamBusyError(Exception):
+    """Raised when work cannot be admitted or an upstream stays rate limited after all retries"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is over capacity, retry after {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        """Retry-After value in whole seconds"""
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Check whether an exception from an upstream SDK signals a 429"""
+    if isinstance(error, UpstreamRateLimited):
+        return True
+    try:
+        from google.api_core import exceptions as google_exceptions
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            return True
+    except ImportError:
+        pass
+    return getattr(error, "code", None) == 429 or getattr(error, "status_code", None) == 429
+
+
+class TokenBucket:
+    """Thread-safe token bucket; a rate of 0 disables limiting"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, waiting up to timeout seconds for it"""
+        if self.rate <= 0:
+            return True
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class UpstreamLimiter:
+    """Per-upstream rate limit, concurrency cap and 429-aware retry with backoff"""
+
+    def __init__(self, name: str, rate: float, burst: float, max_concurrency: int,
+                 acquire_timeout: float, max_retries: int, retry_base_delay: float):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.acquire_timeout = acquire_timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self):
+        """Hold one concurrency slot and one rate token for the duration of a call"""
+        if not self.semaphore.acquire(timeout=self.acquire_timeout):
+            self._count("rejected")
+            raise UpstreamBusyError(self.name, self.acquire_timeout)
+        try:
+            if not self.bucket.acquire(self.acquire_timeout):
+                self._count("rejected")
+                raise UpstreamBusyError(self.name, self.acquire_timeout)
+            self._count("calls")
+            yield
+        finally:
+            self.semaphore.release()
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn inside a slot, retrying with exponential backoff when it is rate limited"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.slot():
+                    return fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                delay = getattr(e, "retry_after", None) or self.retry_base_delay * (2 ** attempt)
+                delay += random.uniform(0, self.retry_base_delay)
+                if attempt == self.max_retries:
+                    raise UpstreamBusyError(self.name, delay) from e
+                self._count("retries")
+                logger.warning(f"{self.name} rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for this upstream"""
+        with self._lock:
+            return {"name": self.name, "calls": self.calls, "retries": self.retries, "rejected": self.rejected}
+
+
+class AdmissionController:
+    """Bounded request queue in front of the chat endpoint that sheds load when full"""
+
+    def __init__(self, max_active: int, max_queue: int, retry_after: float):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_active)
+        self._pending = 0
+        self.admitted = 0
+        self.shed = 0
+
+    @asynccontextmanager
+    async def admit(self):
+        """Wait for an active slot, or fail fast with UpstreamBusyError when the queue is full"""
+        if self._pending >= self.max_active + self.max_queue:
+            self.shed += 1
+            raise UpstreamBusyError("chat", self.retry_after)
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                self.admitted += 1
+                yield
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for the admission queue"""
+        return {
+            "pending": self._pending,
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "shed": self.shed
+        }
+
+
+def _limiter_from_env(name: str, prefix: str, default_rate: str, default_burst: str, default_concurrency: str) -> UpstreamLimiter:
+    return UpstreamLimiter(
+        name,
+        rate=float(os.getenv(f"{prefix}_RATE_LIMIT_RPS", default_rate)),
+        burst=float(os.getenv(f"{prefix}_RATE_LIMIT_BURST", default_burst)),
+        max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", default_concurrency)),
+        acquire_timeout=float(os.getenv("UPSTREAM_ACQUIRE_TIMEOUT", "30")),
+        max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "3")),
+        retry_base_delay=float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "1.0"))
+    )
+
+
+# Process-wide limiters shared by every service instance
+gemini_limiter = _limiter_from_env("gemini", "GEMINI", "1.0", "5", "4")
+search_limiter = _limiter_from_env("search", "SEARCH", "5.0", "5", "4")
+chat_admission = AdmissionController(
+    max_active=int(os.getenv("CHAT_MAX_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("CHAT_MAX_QUEUE", "16")),
+    retry_after=float(os.getenv("CHAT_RETRY_AFTER", "5"))
+)
+
+
+def rate_limit_stats() -> Dict[str, Any]:
+    """Return counters for all limiters in this process"""
+    return {
+        "upstreams": [gemini_limiter.stats(), search_limiter.stats()],
+        "admission": chat_admission.stats()
+    }
@@ -2,9 +2,12 @@ import os
 import requests
 import json
 import logging
+import threading
 from typing import List, Optional, Dict, Any
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
+from app.services.single_flight import SingleFlight, normalize_query, normalize_url
+from app.services.rate_limit import UpstreamBusyError, UpstreamRateLimited, search_limiter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -13,6 +16,10 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Shared across SearchService instances so concurrent identical work is coalesced process-wide
+_search_flight = SingleFlight("search_web")
+_extract_flight = SingleFlight("extract_content")
+
 class SearchService:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_SEARCH_API_KEY")
@@ -27,6 +34,11 @@ class SearchService:
             logger.warning("GOOGLE_SEARCH_ENGINE_ID not found in environment variables")
         
     def search_web(self, query: str) -> List[Dict[str, str]]:
+        """Search the web, sharing one upstream request among concurrent identical queries"""
+        key = (normalize_query(query), self.max_results)
+        return _search_flight.do(key, self._search_web, query)
+
+    def _search_web(self, query: str) -> List[Dict[str, str]]:
         """Search the web using Google Search API and return a list of search result dictionaries"""
         try:
             if not self.api_key or not self.search_engine_id:
@@ -46,7 +58,7 @@ class SearchService:
             
             # Make request to Google Search API
             logger.debug(f"Sending request to Google Search API...")
-            response = requests.get(search_url, params=params, timeout=10)
+            response = search_limiter.call(self._get_search_results, search_url, params)
             
             if response.status_code != 200:
                 logger.error(f"Error in Google Search API: {response.status_code}: {response.text}")
@@ -73,6 +85,9 @@ class SearchService:
                 
             return formatted_results
         
+        except UpstreamBusyError as e:
+            logger.error(f"Google Search API over quota: {str(e)}")
+            return []
         except requests.exceptions.Timeout:
             logger.error("Request to Google Search API timed out")
             return []
@@ -86,7 +101,20 @@ class SearchService:
             logger.exception(f"Unexpected error in web search: {str(e)}")
             return []
             
+    def _get_search_results(self, search_url: str, params: Dict[str, Any]) -> requests.Response:
+        """Send one request to Google Search API, signalling 429 so the limiter can back off"""
+        response = requests.get(search_url, params=params, timeout=10)
+        if response.status_code == 429:
+            retry_after = response.headers.get("Retry-After")
+            raise UpstreamRateLimited(float(retry_after) if retry_after and retry_after.isdigit() else None)
+        return response
+            
     def extract_content_from_url(self, url: str, max_content_length: int = 5000) -> Dict[str, Any]:
+        """Extract content from a URL, sharing one fetch among concurrent identical requests"""
+        key = (normalize_url(url), max_content_length)
+        return _extract_flight.do(key, self._extract_content_from_url, url, max_content_length)
+
+    def _extract_content_from_url(self, url: str, max_content_length: int = 5000) -> Dict[str, Any]:
         """
         Extract content from a URL
         
@@ -176,7 +204,8 @@ class SearchService:
             result["content"] = f"Error extracting content: {str(e)}"
             return result
             
-    def search_and_extract(self, query: str, max_extractions: int = 3, max_content_length: int = 5000) -> List[Dict[str, Any]]:
+    def search_and_extract(self, query: str, max_extractions: int = 3, max_content_length: int = 5000,
+                           cancel: Optional[threading.Event] = None) -> List[Dict[str, Any]]:
         """
         Search the web and extract content from the top results
         
@@ -184,6 +213,7 @@ class SearchService:
             query: The search query
             max_extractions: Maximum number of URLs to extract content from
             max_content_length: Maximum length of content to extract from each URL
+            cancel: Optional event; when set, remaining extractions are skipped
             
         Returns:
             List of dictionaries containing search results with extracted content
@@ -196,6 +226,8 @@ class SearchService:
         
         # Extract content from each result
         for result in results_to_process:
+            if cancel is not None and cancel.is_set():
+                break
             url = result["url"]
             extracted = self.extract_content_from_url(url, max_content_length)
             
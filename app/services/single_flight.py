@@ -0,0 +1,98 @@
+import copy
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    """A single in-flight call that followers can wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share the same key into one execution
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is still running wait for it and receive a deep copy of a
+    snapshot taken before they are released, so they never share mutable state
+    with the leader or with each other.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+        _groups.append(self)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) unless an identical call is already in flight"""
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._calls[key] = call
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            logger.info(f"[{self.name}] Coalesced in-flight request for key: {key}")
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = fn(*args, **kwargs)
+            # Followers copy from a private snapshot, never from the object the leader goes on to mutate
+            call.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for this group"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls)
+            }
+
+
+_groups: List[SingleFlight] = []
+
+
+def single_flight_stats() -> List[Dict[str, Any]]:
+    """Return counters for every single-flight group in this process"""
+    return [group.stats() for group in _groups]
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different spellings share a key"""
+    return " ".join(query.split()).casefold()
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL by lowercasing scheme and host and dropping the fragment"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or "/", parts.query, ""))
@@ -0,0 +1,320 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EmbeddingFunction = Callable[[List[str]], List[List[float]]]
+
+
+def matches_where(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style where filter ($eq, $ne, $in, $nin, $and, $or or plain values)"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+            continue
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+    return True
+
+
+class NumpyVectorStore:
+    """
+    Lightweight in-process vector store with the subset of the Chroma collection API MemoryService uses
+
+    Layout under path:
+        embeddings.f32   append-only float32 matrix of unit-normalized rows, memory-mapped for search
+        metadata.jsonl   one {"id", "document", "metadata"} line per row
+        header.json      embedding dimension
+
+    Search is a vectorized brute-force dot product over the mapped matrix. Past
+    ivf_threshold rows an IVF index (k-means centroids with inverted lists) is
+    built in memory and only the nprobe closest lists are scanned. Distances are
+    squared L2 between unit vectors (2 - 2 * cosine), matching Chroma's default
+    space so existing distance thresholds keep their meaning.
+    """
+
+    def __init__(self, path: str, embedding_function: Optional[EmbeddingFunction] = None,
+                 ivf_threshold: int = 50000, nprobe: int = 8):
+        """
+        Args:
+            path: Directory holding the store's files (created if missing)
+            embedding_function: Maps texts to embeddings; needed when add/query are given texts
+            ivf_threshold: Row count above which queries use the IVF index
+            nprobe: Inverted lists scanned per IVF query
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.embedding_function = embedding_function
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+
+        self._embeddings_file = self.path / "embeddings.f32"
+        self._metadata_file = self.path / "metadata.jsonl"
+        self._header_file = self.path / "header.json"
+        self._lock = threading.RLock()
+
+        self.dim: Optional[int] = None
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._ivf: Optional[Dict[str, Any]] = None
+        # Filter masks per where clause, extended incrementally as rows are appended
+        self._masks: Dict[str, np.ndarray] = {}
+        # Size of the sidecar this process has read or written, to detect appends by another process
+        self._sidecar_size = 0
+        self._load()
+
+    def _load(self):
+        """
+        Read the sidecar and header, trimming whatever a crash left half-written
+
+        Both files are cut back to the rows they have in common, so the next
+        append starts on a clean line and a clean row boundary.
+        """
+        if self._header_file.exists():
+            self.dim = json.loads(self._header_file.read_text(encoding="utf-8"))["dim"]
+
+        # Byte offset just past each complete record in the sidecar
+        line_ends: List[int] = []
+        if self._metadata_file.exists():
+            offset = 0
+            with open(self._metadata_file, "rb") as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # Torn final line from an interrupted write
+                    offset += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    self._ids.append(record["id"])
+                    self._documents.append(record["document"])
+                    self._metadatas.append(record["metadata"])
+                    line_ends.append(offset)
+
+        rows = 0
+        if self.dim is not None and self._embeddings_file.exists():
+            rows = self._embeddings_file.stat().st_size // (4 * self.dim)
+        count = min(rows, len(self._ids))
+
+        if self._embeddings_file.exists() and self.dim is not None \
+                and self._embeddings_file.stat().st_size != count * 4 * self.dim:
+            with open(self._embeddings_file, "r+b") as f:
+                f.truncate(count * 4 * self.dim)
+        sidecar_size = line_ends[count - 1] if count else 0
+        if self._metadata_file.exists() and self._metadata_file.stat().st_size != sidecar_size:
+            with open(self._metadata_file, "r+b") as f:
+                f.truncate(sidecar_size)
+        if count != len(self._ids) or rows != count:
+            logger.warning(f"Trimmed vector store at {self.path} to {count} complete rows after an interrupted write")
+
+        del self._ids[count:], self._documents[count:], self._metadatas[count:]
+        self._sidecar_size = sidecar_size
+        logger.info(f"Loaded vector store at {self.path} with {len(self._ids)} rows")
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(self) -> Dict[str, List]:
+        """Return all ids, documents and metadatas"""
+        with self._lock:
+            return {"ids": list(self._ids), "documents": list(self._documents), "metadatas": list(self._metadatas)}
+
+    def add(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+            embeddings: Optional[List[List[float]]] = None):
+        """Append rows; documents are embedded with embedding_function unless embeddings are given"""
+        if embeddings is None:
+            embeddings = self._embed(documents)
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        metadatas = metadatas or [{} for _ in ids]
+
+        with self._lock:
+            self._check_unchanged()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._header_file.write_text(json.dumps({"dim": self.dim}), encoding="utf-8")
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match store dimension {self.dim}")
+
+            # Embeddings first: on load, rows beyond the metadata sidecar are trimmed
+            with open(self._embeddings_file, "ab") as f:
+                f.write(vectors.tobytes())
+            lines = "".join(
+                json.dumps({"id": row_id, "document": document, "metadata": metadata}, ensure_ascii=False) + "\n"
+                for row_id, document, metadata in zip(ids, documents, metadatas)
+            ).encode("utf-8")
+            with open(self._metadata_file, "ab") as f:
+                f.write(lines)
+            self._sidecar_size += len(lines)
+
+            start = len(self._ids)
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(metadatas)
+            self._matrix = None  # Remapped on next query
+            if self._ivf is not None:
+                self._ivf_assign(vectors, start)
+
+    def _check_unchanged(self):
+        """Raise if the files no longer match the rows this process knows about (caller holds the lock)"""
+        embeddings_size = self._embeddings_file.stat().st_size if self._embeddings_file.exists() else 0
+        sidecar_size = self._metadata_file.stat().st_size if self._metadata_file.exists() else 0
+        if embeddings_size != len(self._ids) * 4 * (self.dim or 0) or sidecar_size != self._sidecar_size:
+            raise RuntimeError(f"Vector store at {self.path} was modified by another process; restart to reload it")
+
+    def upsert(self, ids: List[str], documents: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+               embeddings: Optional[List[List[float]]] = None):
+        """Add rows whose ids are new; rows are immutable, so ids already stored are left unchanged"""
+        with self._lock:
+            known = set(self._ids)
+            keep = [i for i, row_id in enumerate(ids) if row_id not in known]
+            if not keep:
+                return
+            self.add(
+                ids=[ids[i] for i in keep],
+                documents=[documents[i] for i in keep],
+                metadatas=[metadatas[i] for i in keep] if metadatas else None,
+                embeddings=[embeddings[i] for i in keep] if embeddings is not None else None
+            )
+
+    def query(self, query_texts: Optional[List[str]] = None, query_embeddings: Optional[List[List[float]]] = None,
+              n_results: int = 10, where: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Any]]]:
+        """Return the n_results nearest rows per query in Chroma's result layout"""
+        if query_embeddings is None:
+            query_embeddings = self._embed(query_texts or [])
+        queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            matrix = self._mapped_matrix()
+            mask = self._where_mask(where) if where else None
+            use_ivf = len(self._ids) > self.ivf_threshold
+            if use_ivf and (self._ivf is None or len(self._ids) >= 2 * self._ivf["built_at"]):
+                self._ivf_build(matrix)
+
+            for query in queries:
+                candidates = self._ivf_candidates(query) if use_ivf else None
+                top, sims = self._search(matrix, query, n_results, mask, candidates)
+                results["ids"].append([self._ids[i] for i in top])
+                results["documents"].append([self._documents[i] for i in top])
+                results["metadatas"].append([self._metadatas[i] for i in top])
+                results["distances"].append([float(2 - 2 * s) for s in sims])
+        return results
+
+    def _where_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """Boolean row mask for a where clause, evaluating only rows added since it was last used"""
+        key = json.dumps(where, sort_keys=True, default=str)
+        mask = self._masks.get(key)
+        done = 0 if mask is None else len(mask)
+        if done < len(self._metadatas):
+            fresh = np.fromiter((matches_where(m, where) for m in self._metadatas[done:]), dtype=bool,
+                                count=len(self._metadatas) - done)
+            mask = fresh if mask is None else np.concatenate([mask, fresh])
+            if key not in self._masks and len(self._masks) >= 16:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = mask
+        return mask
+
+    @staticmethod
+    def _search(matrix: np.ndarray, query: np.ndarray, n_results: int, mask: Optional[np.ndarray],
+                candidates: Optional[np.ndarray]):
+        """Brute-force top-k by dot product over all rows or a candidate subset"""
+        if matrix is None or len(matrix) == 0:
+            return [], []
+        if candidates is None:
+            # Full scan: one matrix-vector product, then drop filtered rows
+            sims = matrix @ query
+            rows = np.arange(len(matrix))
+            if mask is not None:
+                rows = rows[mask]
+                sims = sims[mask]
+        else:
+            rows = candidates if mask is None else candidates[mask[candidates]]
+            sims = matrix[rows] @ query
+        if len(rows) == 0:
+            return [], []
+        k = min(n_results, len(rows))
+        part = np.argpartition(-sims, k - 1)[:k]
+        order = part[np.argsort(-sims[part])]
+        return rows[order].tolist(), sims[order].tolist()
+
+    def _mapped_matrix(self) -> Optional[np.ndarray]:
+        """Memory-map the embedding file for the current row count"""
+        if self._matrix is None and self._ids:
+            self._matrix = np.memmap(self._embeddings_file, dtype=np.float32, mode="r", shape=(len(self._ids), self.dim))
+        return self._matrix
+
+    def _ivf_build(self, matrix: np.ndarray, iterations: int = 10):
+        """Cluster rows with k-means (on a sample) into sqrt(n) inverted lists"""
+        n = len(matrix)
+        nlist = max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(0)
+        sample = np.asarray(matrix[rng.choice(n, size=min(n, nlist * 64), replace=False)])
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assignment == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+
+        assignment = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 65536):
+            assignment[start:start + 65536] = np.argmax(np.asarray(matrix[start:start + 65536]) @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+        lists = [order[bounds[c]:bounds[c + 1]] for c in range(nlist)]
+        self._ivf = {"centroids": centroids, "lists": lists, "built_at": n}
+        logger.info(f"Built IVF index with {nlist} lists over {n} rows")
+
+    def _ivf_assign(self, vectors: np.ndarray, start: int):
+        """Add newly appended rows to their nearest inverted lists"""
+        assignment = np.argmax(vectors @ self._ivf["centroids"].T, axis=1)
+        lists = self._ivf["lists"]
+        for offset, c in enumerate(assignment):
+            lists[c] = np.append(lists[c], start + offset)
+
+    def _ivf_candidates(self, query: np.ndarray) -> np.ndarray:
+        centroids = self._ivf["centroids"]
+        probe = np.argsort(-(centroids @ query))[:self.nprobe]
+        return np.sort(np.concatenate([self._ivf["lists"][c] for c in probe]))
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.embedding_function is None:
+            raise ValueError("No embedding function configured; pass embeddings explicitly")
+        return self.embedding_function(texts)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
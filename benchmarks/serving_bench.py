@@ -0,0 +1,68 @@
+"""
+Closed-loop HTTP load generator for measuring how throughput scales with workers
+
+Usage:
+    python run.py --prod --workers 4 &
+    python benchmarks/serving_bench.py --url http://localhost:8000/api/chat/history --concurrency 64 --duration 20
+
+Run it once per worker count and compare requests/second. POST /api/chat is
+bound by Gemini quotas, so scaling is best measured on the CPU/IO-bound
+endpoints (/, /api/chat/history, /api/metrics).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import httpx
+
+
+async def worker(client: httpx.AsyncClient, url: str, deadline: float, latencies: List[float], errors: List[int]):
+    """Send requests back to back until the deadline"""
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError:
+            errors.append(0)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run(url: str, concurrency: int, duration: float):
+    latencies: List[float] = []
+    errors: List[int] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        # Warm up connections and caches
+        await asyncio.gather(*[client.get(url) for _ in range(concurrency)])
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*[worker(client, url, deadline, latencies, errors) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    if not latencies:
+        print(f"No successful requests ({len(errors)} errors)")
+        return
+    latencies.sort()
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(f"URL:          {url}")
+    print(f"Concurrency:  {concurrency}")
+    print(f"Requests:     {len(latencies)} ok, {len(errors)} errors in {elapsed:.1f}s")
+    print(f"Throughput:   {len(latencies) / elapsed:.1f} req/s")
+    print(f"Latency p50:  {quantiles[49] * 1000:.1f} ms")
+    print(f"Latency p95:  {quantiles[94] * 1000:.1f} ms")
+    print(f"Latency p99:  {quantiles[98] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP throughput benchmark")
+    parser.add_argument("--url", default="http://localhost:8000/api/chat/history")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.duration))
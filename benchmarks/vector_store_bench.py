@@ -0,0 +1,147 @@
+"""
+Compare the NumPy memory-mapped vector store with ChromaDB
+
+Each backend runs in its own subprocess so resident memory is measured in
+isolation. Rows are inserted one at a time, as MemoryService.store_interaction
+does, using random unit vectors in place of Gemini embeddings.
+
+Usage:
+    python benchmarks/vector_store_bench.py --rows 5000 --queries 200 --dim 768
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def rss_mb() -> float:
+    """Current resident set size in MiB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentiles(samples):
+    q = statistics.quantiles(samples, n=100)
+    return {"p50_ms": q[49] * 1000, "p95_ms": q[94] * 1000, "mean_ms": statistics.mean(samples) * 1000}
+
+
+def open_store(backend: str, path: str, ivf_threshold: int):
+    if backend == "numpy":
+        from app.services.vector_store import NumpyVectorStore
+        return NumpyVectorStore(path, ivf_threshold=ivf_threshold)
+    import chromadb
+    from chromadb.config import Settings
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    return client.get_or_create_collection(name="memory", embedding_function=None)
+
+
+def run_backend(backend: str, rows: int, queries: int, dim: int, ivf_threshold: int) -> dict:
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(rows, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    probes = vectors[rng.choice(rows, size=queries, replace=False)]
+    path = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    baseline = rss_mb()
+
+    try:
+        start = time.perf_counter()
+        store = open_store(backend, path, ivf_threshold)
+        open_empty = time.perf_counter() - start
+
+        insert = []
+        for i in range(rows):
+            metadata = {"role": "user" if i % 2 else "model", "timestamp": f"2025-01-01T00:00:{i:06d}"}
+            start = time.perf_counter()
+            store.add(ids=[f"m{i}"], documents=[f"message {i}"], metadatas=[metadata], embeddings=[vectors[i].tolist()])
+            insert.append(time.perf_counter() - start)
+
+        query, filtered = [], []
+        for probe in probes:
+            start = time.perf_counter()
+            store.query(query_embeddings=[probe.tolist()], n_results=8)
+            query.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            store.query(query_embeddings=[probe.tolist()], n_results=8, where={"role": {"$eq": "user"}})
+            filtered.append(time.perf_counter() - start)
+
+        del store
+        start = time.perf_counter()
+        reopened = open_store(backend, path, ivf_threshold)
+        reopened.query(query_embeddings=[probes[0].tolist()], n_results=8)
+        reopen = time.perf_counter() - start
+
+        return {
+            "backend": backend,
+            "open_empty_ms": open_empty * 1000,
+            "insert": percentiles(insert),
+            "query": percentiles(query),
+            "query_where": percentiles(filtered),
+            "reopen_first_query_ms": reopen * 1000,
+            "rss_mb": rss_mb(),
+            "rss_growth_mb": rss_mb() - baseline
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def print_table(results):
+    print(f"{'metric':<24}" + "".join(f"{r['backend']:>14}" for r in results))
+    rows = [
+        ("open empty (ms)", lambda r: r["open_empty_ms"]),
+        ("insert p50 (ms)", lambda r: r["insert"]["p50_ms"]),
+        ("insert p95 (ms)", lambda r: r["insert"]["p95_ms"]),
+        ("query p50 (ms)", lambda r: r["query"]["p50_ms"]),
+        ("query p95 (ms)", lambda r: r["query"]["p95_ms"]),
+        ("query+where p50 (ms)", lambda r: r["query_where"]["p50_ms"]),
+        ("query+where p95 (ms)", lambda r: r["query_where"]["p95_ms"]),
+        ("reopen+query (ms)", lambda r: r["reopen_first_query_ms"]),
+        ("resident memory (MiB)", lambda r: r["rss_mb"]),
+    ]
+    for label, get in rows:
+        print(f"{label:<24}" + "".join(f"{get(r):>14.2f}" for r in results))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector store insert/query/memory benchmark")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--backends", default="numpy,chroma")
+    parser.add_argument("--ivf-threshold", type=int, default=50000, help="Rows above which the NumPy store uses IVF")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args.rows, args.queries, args.dim, args.ivf_threshold)))
+        sys.exit(0)
+
+    results = []
+    for backend in args.backends.split(","):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--rows", str(args.rows),
+             "--queries", str(args.queries), "--dim", str(args.dim), "--ivf-threshold", str(args.ivf_threshold)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"{backend} failed:\n{proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else ''}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    if results:
+        print(f"{args.rows} rows, {args.queries} queries, dim {args.dim}")
+        print_table(results)
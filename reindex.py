@@ -0,0 +1,26 @@
+import argparse
+from dotenv import load_dotenv
+
+from app.services.memory_reindex import MemoryReindexer
+
+# Load environment variables
+load_dotenv()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the memory collection from the SQLite chat log (stop the server first)")
+    parser.add_argument("--db", default="./data/myai.db", help="SQLite database with the chat table")
+    parser.add_argument("--batch-size", type=int, default=100, help="Texts per embedding request (max 100)")
+    parser.add_argument("--parallelism", type=int, default=4, help="Embedding requests in flight at once")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <CHROMADB_PERSIST_DIR>/reindex_checkpoint.json)")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any existing checkpoint and start over")
+    parser.add_argument("--drop-old", action="store_true", help="Delete the previously active collection after the swap")
+    args = parser.parse_args()
+
+    reindexer = MemoryReindexer(
+        db_file=args.db,
+        batch_size=args.batch_size,
+        parallelism=args.parallelism,
+        checkpoint_path=args.checkpoint
+    )
+    indexed = reindexer.run(resume=not args.no_resume, drop_old=args.drop_old)
+    print(f"Reindex complete: {indexed} rows indexed")
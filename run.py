@@ -1,6 +1,10 @@
 import uvicorn
 import os
+import argparse
 from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
 
 # Create necessary directories
 data_dir = Path("./data")
@@ -10,6 +14,35 @@ chroma_dir = Path(os.getenv("CHROMADB_PERSIST_DIR", "./chroma_db"))
 chroma_dir.mkdir(exist_ok=True)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Personal AI Assistant")
+    parser.add_argument("--prod", action="store_true", help="Production mode: multiple workers, uvloop/httptools, no reload")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="Number of worker processes in production mode (default: WEB_CONCURRENCY or CPU count)")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    args = parser.parse_args()
+    if args.prod and args.workers > 1:
+        # Embedded memory backends keep their index in one process; workers would each see only their own writes
+        backend = os.getenv("MEMORY_BACKEND", "chroma").lower()
+        if backend == "numpy":
+            parser.error("MEMORY_BACKEND=numpy supports a single worker; use --workers 1 or a shared Chroma server")
+        if backend == "chroma" and not os.getenv("CHROMADB_HOST"):
+            parser.error("the embedded Chroma client supports a single worker; use --workers 1 or set CHROMADB_HOST "
+                         "to a Chroma server (chroma run --path ./chroma_db --port 8001)")
+
     print("Starting Personal AI Assistant...")
-    print("Access the web interface at http://localhost:8000")
-    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    print(f"Access the web interface at http://localhost:{args.port}")
+    if args.prod:
+        print(f"Production mode with {args.workers} workers")
+        uvicorn.run(
+            "app.main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            loop="uvloop",
+            http="httptools",
+            reload=False,
+            access_log=False
+        )
+    else:
+        uvicorn.run("app.main:app", host=args.host, port=args.port, reload=True)
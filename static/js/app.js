@@ -11,6 +11,13 @@ document.addEventListener('DOMContentLoaded', function() {
     let webSearchEnabled = false; // Default to disabled
     let isMobile = window.innerWidth <= 768;
     
+    // Speculative prefetch while typing (debounced, previous request aborted)
+    const PREFETCH_DEBOUNCE_MS = 600;
+    const PREFETCH_MIN_CHARS = 12;
+    let prefetchTimer = null;
+    let prefetchController = null;
+    let lastPrefetchedDraft = '';
+    
     // Setup UI based on device size
     function setupUIForDeviceSize() {
         isMobile = window.innerWidth <= 768;
@@ -85,8 +92,56 @@ document.addEventListener('DOMContentLoaded', function() {
         if (this.scrollHeight > 150) {
             this.style.height = '150px';
         }
+        
+        schedulePrefetch(this.value.trim());
     });
     
+    // Ask the server to warm search and memory results for the current draft
+    function schedulePrefetch(draft) {
+        clearTimeout(prefetchTimer);
+        prefetchTimer = setTimeout(function() {
+            if (draft.length < PREFETCH_MIN_CHARS) {
+                if (lastPrefetchedDraft) {
+                    cancelPrefetch();
+                }
+                return;
+            }
+            if (draft === lastPrefetchedDraft) return;
+            
+            if (prefetchController) {
+                prefetchController.abort();
+            }
+            prefetchController = new AbortController();
+            lastPrefetchedDraft = draft;
+            
+            fetch('/api/prefetch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    client_id: currentChatId,
+                    draft,
+                    web_search_enabled: webSearchEnabled
+                }),
+                signal: prefetchController.signal
+            }).catch(() => {
+                // Prefetch is best-effort; the real request does the work if this fails
+            });
+        }, PREFETCH_DEBOUNCE_MS);
+    }
+    
+    // Drop the server-side prefetch when the draft no longer applies
+    function cancelPrefetch() {
+        lastPrefetchedDraft = '';
+        if (prefetchController) {
+            prefetchController.abort();
+            prefetchController = null;
+        }
+        fetch('/api/prefetch/' + encodeURIComponent(currentChatId), { method: 'DELETE' })
+            .catch(() => {});
+    }
+    
     // Handle form submission
     chatForm.addEventListener('submit', function(event) {
         event.preventDefault();
@@ -97,9 +152,12 @@ document.addEventListener('DOMContentLoaded', function() {
         // Add user message to UI
         addMessage(message, 'user');
         
-        // Clear input
+        // Clear input; the pending prefetch (if any) is claimed by the chat request
         userInput.value = '';
         userInput.style.height = 'auto';
+        clearTimeout(prefetchTimer);
+        prefetchController = null;
+        lastPrefetchedDraft = '';
         
         // Close sidebar on mobile if open
         if (isMobile && sidebar.classList.contains('show')) {
@@ -122,7 +180,8 @@ document.addEventListener('DOMContentLoaded', function() {
             },
             body: JSON.stringify({ 
                 message, 
-                web_search_enabled: webSearchEnabled 
+                web_search_enabled: webSearchEnabled,
+                client_id: currentChatId
             }),
         })
         .then(response => {
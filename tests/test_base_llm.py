@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from app.services.llm import base_llm
+from app.services.llm.base_llm import BaseLLM
+from app.services.llm.llm_policy import LLMDeadlineExceeded, LLMPolicy
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeSession:
+    """Stands in for google.generativeai's ChatSession"""
+
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, prompt, stream=False, request_options=None):
+        model = self.model
+        if model.config.get("fail"):
+            raise RuntimeError(f"{model.model_name} is unavailable")
+
+        def chunks():
+            time.sleep(model.config.get("first_delay", 0))
+            for word in model.config.get("reply", f"{model.model_name} answer").split():
+                yield FakeChunk(word + " ")
+                time.sleep(0.02)
+            model.completed += 1
+            self.history = self.history + [{"role": "user", "parts": prompt},
+                                           {"role": "model", "parts": model.config.get("reply")}]
+        return chunks()
+
+
+class FakeModel:
+    """Stands in for google.generativeai.GenerativeModel, configured per model name"""
+
+    configs = {}
+
+    def __init__(self, model_name, **kwargs):
+        self.model_name = model_name
+        self.config = FakeModel.configs.get(model_name, {})
+        self.completed = 0
+
+    def start_chat(self, history=None):
+        return FakeSession(self, history)
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        return self.start_chat().send_message(prompt, stream=stream, request_options=request_options)
+
+
+class PassthroughLimiter:
+    def call(self, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def fake_gemini(monkeypatch):
+    monkeypatch.setattr(base_llm.genai, "configure", lambda **kwargs: None)
+    monkeypatch.setattr(base_llm.genai, "GenerativeModel", FakeModel)
+    monkeypatch.setattr(base_llm, "gemini_limiter", PassthroughLimiter())
+    monkeypatch.setattr(base_llm, "load_system_prompt", lambda: "system prompt")
+    FakeModel.configs = {}
+
+
+def make_llm(is_main=False, **policy):
+    return BaseLLM(is_main=is_main, policy=LLMPolicy("test", "primary", "fallback", **policy))
+
+
+def test_primary_answers():
+    FakeModel.configs = {"primary": {"reply": "from primary"}, "fallback": {"reply": "from fallback"}}
+    assert make_llm().generate_response("question").strip() == "from primary"
+
+
+def test_hedge_wins_when_primary_is_silent():
+    FakeModel.configs = {"primary": {"first_delay": 0.6, "reply": "from primary"},
+                         "fallback": {"reply": "from fallback"}}
+    llm = make_llm(hedge_after_ms=100)
+    start = time.monotonic()
+    assert llm.generate_response("question").strip() == "from fallback"
+    assert time.monotonic() - start < 0.4
+
+    # The losing primary is cancelled at its first chunk instead of streaming to the end
+    time.sleep(0.8)
+    assert llm.model.completed == 0
+    assert llm.fallback_model.completed == 1
+
+
+def test_fallback_after_primary_error():
+    FakeModel.configs = {"primary": {"fail": True}, "fallback": {"reply": "from fallback"}}
+    assert make_llm().generate_response("question").strip() == "from fallback"
+
+
+def test_deadline_raises():
+    FakeModel.configs = {"primary": {"first_delay": 0.5}, "fallback": {"first_delay": 0.5}}
+    llm = make_llm(is_main=True, deadline_ms=100, hedge_after_ms=20)
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        llm.generate_response("question", chat=llm.new_chat())
+    assert time.monotonic() - start < 0.3
+
+
+def test_fallback_turns_written_back_without_history_prefix():
+    FakeModel.configs = {"primary": {"fail": True}, "fallback": {"reply": "from fallback"}}
+    llm = make_llm(is_main=True)
+    history = [{"role": "user", "parts": "earlier"}, {"role": "model", "parts": "reply"}]
+    prefix = [{"role": "user", "parts": "summary"}, {"role": "model", "parts": "understood"}]
+    chat = llm.new_chat(history)
+
+    assert llm.generate_response("question", chat=chat, history_prefix=prefix).strip() == "from fallback"
+    assert chat.history == history + [{"role": "user", "parts": "question"},
+                                      {"role": "model", "parts": "from fallback"}]
@@ -0,0 +1,134 @@
+import threading
+from types import SimpleNamespace
+
+from app.services.llm.context_cache import ContextCacheManager
+
+
+class FakeCachedContent:
+    """Stands in for google.generativeai.caching.CachedContent"""
+
+    created = []
+    fail_create = False
+    create_started = None
+    create_release = None
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.ttl_updates = []
+        self.deleted = False
+
+    @classmethod
+    def create(cls, **kwargs):
+        if cls.create_started is not None:
+            cls.create_started.set()
+            cls.create_release.wait(5)
+        if cls.fail_create:
+            raise RuntimeError("cached content is below the minimum token count")
+        cache = cls(**kwargs)
+        cls.created.append(cache)
+        return cache
+
+    def update(self, ttl):
+        self.ttl_updates.append(ttl.total_seconds())
+
+    def delete(self):
+        self.deleted = True
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_manager(clock):
+    FakeCachedContent.created = []
+    FakeCachedContent.fail_create = False
+    FakeCachedContent.create_started = None
+    FakeCachedContent.create_release = None
+    return ContextCacheManager(
+        model_name="models/test-001",
+        ttl_seconds=3600,
+        refresh_margin_seconds=300,
+        retire_grace_seconds=600,
+        caching_module=SimpleNamespace(CachedContent=FakeCachedContent),
+        model_factory=lambda cached_content, generation_config: SimpleNamespace(cache=cached_content),
+        clock=clock
+    )
+
+
+PREFIX = [{"role": "user", "parts": "summary"}, {"role": "model", "parts": "ok"}]
+
+
+def test_create_then_hit():
+    manager = make_manager(FakeClock())
+    model = manager.get_model("system", PREFIX)
+    assert model.cache is FakeCachedContent.created[0]
+    assert FakeCachedContent.created[0].kwargs["system_instruction"] == "system"
+    assert manager.get_model("system", PREFIX) is model
+    assert len(FakeCachedContent.created) == 1
+    assert manager.stats()["created"] == 1 and manager.stats()["hits"] == 1
+
+
+def test_ttl_extended_near_expiry():
+    clock = FakeClock()
+    manager = make_manager(clock)
+    model = manager.get_model("system", PREFIX)
+    clock.now += 3600 - 100  # inside the refresh margin
+    assert manager.get_model("system", PREFIX) is model
+    assert FakeCachedContent.created[0].ttl_updates == [3600]
+    assert manager.stats()["refreshed"] == 1
+    assert manager.stats()["expires_in"] == 3600
+
+
+def test_prefix_change_replaces_and_retires_old_cache():
+    clock = FakeClock()
+    manager = make_manager(clock)
+    old_model = manager.get_model("system", PREFIX)
+    new_model = manager.get_model("system", PREFIX + [{"role": "user", "parts": "more"}])
+    old, new = FakeCachedContent.created
+    assert new_model.cache is new and old_model.cache is old
+    # Turns still running on the old cache keep working until the grace period ends
+    assert not old.deleted
+    assert old.ttl_updates == [600]
+    assert manager.stats()["retired"] == 1
+
+
+def test_failed_create_backs_off():
+    clock = FakeClock()
+    manager = make_manager(clock)
+    FakeCachedContent.fail_create = True
+    assert manager.get_model("system", PREFIX) is None
+    assert manager.get_model("system", PREFIX) is None
+    assert manager.stats()["failures"] == 1  # second call did not retry
+
+    FakeCachedContent.fail_create = False
+    clock.now += 3601
+    assert manager.get_model("system", PREFIX) is not None
+
+
+def test_create_runs_outside_the_lock():
+    manager = make_manager(FakeClock())
+    FakeCachedContent.create_started = threading.Event()
+    FakeCachedContent.create_release = threading.Event()
+    worker = threading.Thread(target=manager.get_model, args=("system", PREFIX))
+    worker.start()
+    assert FakeCachedContent.create_started.wait(5)
+
+    # While the upload is in flight, stats and other turns do not block
+    assert manager.stats()["active"] is False
+    assert manager.get_model("system", PREFIX) is None
+    FakeCachedContent.create_release.set()
+    worker.join(5)
+    assert manager.stats()["created"] == 1
+
+
+def test_close_deletes_active_and_retired_caches():
+    manager = make_manager(FakeClock())
+    manager.get_model("system", PREFIX)
+    manager.get_model("system", [])
+    manager.close()
+    assert all(cache.deleted for cache in FakeCachedContent.created)
+    assert manager.stats()["active"] is False and manager.stats()["retired"] == 0
@@ -0,0 +1,21 @@
+from app.services.prefetch_service import PrefetchService
+from app.services.single_flight import normalize_query
+
+
+def matches(draft, message):
+    service = PrefetchService(get_llm=lambda: None)
+    return service._matches(normalize_query(draft), normalize_query(message))
+
+
+def test_extended_draft_matches():
+    assert matches("what is the weather in par", "What is the weather in Paris")
+    assert matches("is the louvre open on monday", "is the louvre open on monday?")
+
+
+def test_edit_inside_draft_does_not_match():
+    assert not matches("what was the population of france in 2023", "what was the population of france in 2024")
+    assert not matches("is the louvre open on monday", "is the louvre open on sunday")
+
+
+def test_long_extension_does_not_match():
+    assert not matches("is the louvre open", "is the louvre open on sunday and how much are the tickets")
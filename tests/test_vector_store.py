@@ -0,0 +1,63 @@
+import pytest
+
+from app.services.vector_store import NumpyVectorStore
+
+
+def add_row(store, row_id, vector):
+    store.add(ids=[row_id], documents=[f"doc-{row_id}"], metadatas=[{"role": "user"}], embeddings=[vector])
+
+
+def test_rows_survive_restart(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    add_row(store, "a", [1.0, 0.0, 0.0])
+    add_row(store, "b", [0.0, 1.0, 0.0])
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert reloaded.get()["ids"] == ["a", "b"]
+    result = reloaded.query(query_embeddings=[[0.0, 1.0, 0.0]], n_results=1)
+    assert result["documents"] == [["doc-b"]]
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_torn_sidecar_line_is_trimmed(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    add_row(store, "a", [1.0, 0.0, 0.0])
+
+    # Crash while appending row b: its vector is written, its metadata line is cut short
+    with open(tmp_path / "embeddings.f32", "ab") as f:
+        f.write(b"\0" * 12)
+    with open(tmp_path / "metadata.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"id": "b", "docu')
+
+    store = NumpyVectorStore(str(tmp_path))
+    assert store.get()["ids"] == ["a"]
+    add_row(store, "c", [0.0, 1.0, 0.0])
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert reloaded.get()["ids"] == ["a", "c"]
+    assert reloaded.query(query_embeddings=[[0.0, 1.0, 0.0]], n_results=1)["ids"] == [["c"]]
+
+
+def test_sidecar_ahead_of_matrix_is_trimmed(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    add_row(store, "a", [1.0, 0.0, 0.0])
+    with open(tmp_path / "metadata.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"id": "orphan", "document": "no vector", "metadata": {}}\n')
+
+    store = NumpyVectorStore(str(tmp_path))
+    add_row(store, "c", [0.0, 0.0, 1.0])
+
+    reloaded = NumpyVectorStore(str(tmp_path))
+    assert reloaded.get()["ids"] == ["a", "c"]
+    assert reloaded.query(query_embeddings=[[0.0, 0.0, 1.0]], n_results=1)["documents"] == [["doc-c"]]
+
+
+def test_append_by_another_process_is_refused(tmp_path):
+    server = NumpyVectorStore(str(tmp_path))
+    add_row(server, "a", [1.0, 0.0, 0.0])
+    other = NumpyVectorStore(str(tmp_path))
+    add_row(other, "b", [0.0, 1.0, 0.0])
+
+    with pytest.raises(RuntimeError, match="another process"):
+        add_row(server, "c", [0.0, 0.0, 1.0])
+    assert NumpyVectorStore(str(tmp_path)).get()["ids"] == ["a", "b"]